@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Atomic file writes for the on-disk caches. A file is written next to its
+final path and renamed over it only once complete, so a reader, or a build
+running at the same time, never sees a half-written file.
+"""
+
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path):
+    """Open a temporary file next to path for writing in binary mode, and
+    move it to path when the block ends. If the block raises, the
+    temporary file is removed and path is left alone."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -2,12 +2,30 @@
 # a guide
 from sys import stderr
 
-from collections import defaultdict
-from operator import itemgetter
+import asyncio
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy
+from io import BytesIO
+from heapq import heappop, heappush
+from itertools import islice
+from multiprocessing import Pipe
 from struct import pack, unpack
+from time import perf_counter
 
 class SlidingWindow:
-    # The size of the sliding window
+    """The window of earlier input that matches are searched in.
+
+    Positions are indexed by their first byte in chains kept in
+    preallocated arrays: `head` holds the most recent position for each
+    byte value and `prev` is a ring of window size that links each position
+    to the previous one starting with the same byte. Positions that slide
+    out of the window are never removed; a chain walk stops at the first
+    position before `start`, so eviction is O(1).
+    """
+
+    # The size of the sliding window, a power of two
     size = 4096
 
     # The minimum displacement.
@@ -23,16 +41,38 @@ class SlidingWindow:
     # The maximum length of a successful match, inclusive.
     match_max = None
 
+    # The encodings of a back-reference as (longest count, bytes) pairs,
+    # shortest first.
+    token_sizes = None
+
+    # The minimum length of a run taken by run() without a search
+    run_min = 256
+
+    # The number of bytes past a position that adding it to the index reads
+    index_reach = 0
+
     def __init__(self, buf):
         self.data = buf
-        self.hash = defaultdict(list)
         self.full = False
 
+        assert self.size & (self.size - 1) == 0
+        self.head = array('i', [-1]) * 256
+        self.prev = array('i', [-1]) * self.size
+        # scratch space for the candidates of one search()
+        self.cand = array('i', [-1]) * self.size
+
         self.start = 0
         self.stop = 0
         #self.index = self.disp_min - 1
         self.index = 0
 
+        # The highest data index any search has looked at so far; see look()
+        self.horizon = -1
+
+        # The number of search() calls and of the candidates they examined
+        self.searches = 0
+        self.candidates = 0
+
         assert self.match_max is not None
 
     def next(self):
@@ -40,13 +80,9 @@ class SlidingWindow:
             self.index += 1
             return
 
-        if self.full:
-            olditem = self.data[self.start]
-            assert self.hash[olditem][0] == self.start
-            self.hash[olditem].pop(0)
-
         item = self.data[self.stop]
-        self.hash[item].append(self.stop)
+        self.prev[self.stop & (self.size - 1)] = self.head[item]
+        self.head[item] = self.stop
         self.stop += 1
         self.index += 1
 
@@ -56,48 +92,183 @@ class SlidingWindow:
             if self.size <= self.stop:
                 self.full = True
 
+    @property
+    def lookahead(self):
+        """The bytes parsers keep buffered from the index on: match_max, so
+        that matches are never cut short by the end of the buffer rather
+        than the end of the input, plus index_reach, so that every position
+        a match advances over can be indexed."""
+        return self.match_max + self.index_reach
+
     def advance(self, n=1):
         """Advance the window by n bytes"""
         for _ in range(n):
             self.next()
 
+    def skip(self, n):
+        """Advance the window over a run found by run(). Windows that can
+        index the n positions faster than advance() does so, with the same
+        result."""
+        self.advance(n)
+
+    def checkpoint(self):
+        """Return a copy of the window without the lookahead. Resume it by
+        appending the data from its index on to its data."""
+        window = copy(self)
+        window.data = self.data[:self.index]
+        window.head = self.head[:]
+        window.prev = self.prev[:]
+        window.cand = array('i', self.cand)
+        return window
+
+    def rebase(self, n):
+        """Drop the first n bytes of data, which must have slid out of the
+        window, and move every position down by n."""
+        # n is a multiple of size, so every position keeps its prev slot;
+        # evicted positions stay negative without running towards overflow
+        assert n <= self.start and n % self.size == 0
+        self.head = array('i', [i - n if n <= i else -1 for i in self.head])
+        self.prev = array('i', [i - n if n <= i else -1 for i in self.prev])
+        del self.data[:n]
+        self.start -= n
+        self.stop -= n
+        self.index -= n
+        self.horizon -= n
+
+    def look(self, end):
+        """Note that a search has looked at the data up to index end.
+
+        A match of length n at index depends on the data up to index + n:
+        the first byte that differs, or the end of the data if it stopped
+        there. Recording the furthest such index tells when tokens found so
+        far would still be found if the data after it changed.
+        """
+        if self.horizon < end:
+            self.horizon = end
+
+    def walk(self, pos, limit):
+        """Copy the chain from pos into cand, newest first, stopping at the
+        window start or after limit entries. Returns the number copied."""
+        start = self.start
+        prev = self.prev
+        cand = self.cand
+        mask = self.size - 1
+        n = 0
+        while start <= pos and n < limit:
+            cand[n] = pos
+            n += 1
+            pos = prev[pos & mask]
+        self.candidates += n
+        return n
+
     def search(self):
         match_max = self.match_max
         match_min = self.match_min
+        disp_min = self.disp_min
+        index = self.index
+        self.searches += 1
 
-        counts = []
-        indices = self.hash[self.data[self.index]]
-        for i in indices:
-            matchlen = self.match(i, self.index)
-            if matchlen >= match_min:
-                disp = self.index - i
-                #assert self.index - disp >= 0
-                #assert self.disp_min <= disp < self.size + self.disp_min
-                if self.disp_min <= disp:
-                    counts.append((matchlen, -disp))
-                    if matchlen >= match_max:
-                        #assert matchlen == match_max
-                        return counts[-1]
-
-        if counts:
-            match = max(counts, key=itemgetter(0))
-            return match
+        # try the candidates oldest first, so that the oldest of the longest
+        # matches wins
+        cand = self.cand
+        bestlen = 0
+        bestdisp = 0
+        longest = 0
+        for k in range(self.walk(self.head[self.data[index]], self.size) - 1,
+                       -1, -1):
+            i = cand[k]
+            disp = index - i
+            if disp < disp_min:
+                continue
+            matchlen = self.match(i, index)
+            if longest < matchlen:
+                longest = matchlen
+            if matchlen >= match_min and bestlen < matchlen:
+                if matchlen >= match_max:
+                    self.look(index + matchlen)
+                    return (matchlen, -disp)
+                bestlen = matchlen
+                bestdisp = disp
 
+        self.look(index + longest)
+        if bestlen:
+            return (bestlen, -bestdisp)
         return None
 
+    def run(self):
+        """Return the match at the lookahead if it starts a run of a
+        repeated 1- or 2-byte pattern of at least run_min bytes (or
+        match_max, if that is shorter), otherwise None.
+
+        Both patterns repeat at the smallest even displacement allowed, so
+        a single match() call finds the whole run, in time proportional to
+        its length; parsers can then skip() over it without a search.
+        """
+        disp = self.disp_min + (self.disp_min & 1)
+        index = self.index
+        data = self.data
+        if index < disp or data[index] != data[index - disp]:
+            self.look(index)
+            return None
+        matchlen = self.match(index - disp, index)
+        self.look(index + matchlen)
+        if matchlen < min(self.run_min, self.match_max):
+            return None
+        return (matchlen, -disp)
+
     def match(self, start, bufstart):
+        """Return the length of the match between the window position start
+        and the lookahead at bufstart, allowing the copy to overlap the
+        lookahead.
+
+        The first few bytes are compared one at a time, which is cheapest
+        for the short matches that make up most candidates. After that the
+        bytes are compared in slices that double in size, and a slice that
+        differs is halved until the first mismatch is found.
+        """
         size = self.index - start
 
         if size == 0:
             return 0
 
+        data = self.data
+        n = len(data) - bufstart
+        if self.match_max < n:
+            n = self.match_max
+
+        # An overlapping copy repeats the last `size` bytes, so
+        # data[start + (i % size)] == data[start + i] as long as every
+        # earlier byte matched. The overlapping case therefore needs no
+        # special casing: comparing plain slices gives the same length.
         matchlen = 0
-        it = range(min(len(self.data) - bufstart, self.match_max))
-        for i in it:
-            if self.data[start + (i % size)] == self.data[bufstart + i]:
-                matchlen += 1
-            else:
+        while matchlen < n and matchlen < 8:
+            if data[start + matchlen] != data[bufstart + matchlen]:
+                return matchlen
+            matchlen += 1
+
+        step = 32
+        while matchlen < n:
+            if n - matchlen < step:
+                step = n - matchlen
+            a = start + matchlen
+            b = bufstart + matchlen
+            if data[a:a + step] != data[b:b + step]:
                 break
+            matchlen += step
+            step <<= 1
+        else:
+            return matchlen
+
+        # the mismatch is somewhere in data[a:a + step]
+        while step > 1:
+            half = step >> 1
+            if data[a:a + half] == data[b:b + half]:
+                matchlen += half
+                a += half
+                b += half
+                step -= half
+            else:
+                step = half
         return matchlen
 
 class NLZ10Window(SlidingWindow):
@@ -106,150 +277,1237 @@ class NLZ10Window(SlidingWindow):
     match_min = 3
     match_max = 3 + 0xf
 
+    token_sizes = ((3 + 0xf, 2),)
+
 class NLZ11Window(SlidingWindow):
     size = 4096
 
     match_min = 3
     match_max = 0x111 + 0xFFFF
 
+    token_sizes = ((1 + 0xF, 2), (0x11 + 0xFF, 3), (0x111 + 0xFFFF, 4))
+
 class NOverlayWindow(NLZ10Window):
     disp_min = 3
 
-def _compress(input, windowclass=NLZ10Window):
-    """Generates a stream of tokens. Either a byte (int) or a tuple of (count,
-    displacement)."""
+class HashChainWindow(SlidingWindow):
+    """A SlidingWindow indexed by hash chains over 3-byte prefixes.
 
-    window = windowclass(input)
+    The chains work like SlidingWindow's, except that `head` is keyed by a
+    hash of the 3-byte prefix instead of by the first byte.
+
+    Only positions whose 3-byte prefix equals the lookahead can produce a
+    match of `match_min` or more, so search() returns exactly what
+    SlidingWindow.search() returns as long as `max_chain` covers the window.
+    """
+
+    # log2 of the number of slots in the head table
+    hash_bits = 15
+
+    # the hash of a position reads the two bytes after it
+    index_reach = 2
+
+    # The maximum number of chain entries examined by one search(). A value
+    # below `size` trades ratio for speed.
+    max_chain = 4096
+
+    def __init__(self, buf):
+        super().__init__(buf)
+        assert self.match_min >= 3
+
+        self.head = array('i', [-1]) * (1 << self.hash_bits)
+
+    def hash3(self, pos):
+        data = self.data
+        key = (data[pos] << 16) | (data[pos + 1] << 8) | data[pos + 2]
+        return ((key * 0x9E3779B1) & 0xFFFFFFFF) >> (32 - self.hash_bits)
+
+    def next(self):
+        if self.index < self.disp_start - 1:
+            self.index += 1
+            return
+
+        # positions without three bytes left can never start a match; the
+        # parsers keep `lookahead` bytes buffered, so this only happens at
+        # the end of the input
+        if self.stop + 2 < len(self.data):
+            h = self.hash3(self.stop)
+            self.prev[self.stop & (self.size - 1)] = self.head[h]
+            self.head[h] = self.stop
+        self.stop += 1
+        self.index += 1
+
+        if self.full:
+            self.start += 1
+        else:
+            if self.size <= self.stop:
+                self.full = True
+
+    def skip(self, n):
+        """Advance over a run found by run(), indexing its positions in bulk.
+
+        In a run that repeats at displacement d, every position whose 3
+        bytes lie inside the run hashes like the one d bytes before it. So
+        the links of a period of positions give the links of all the others,
+        and the chains come out exactly as advance() would leave them.
+        """
+        d = self.disp_min + (self.disp_min & 1)
+        first = self.stop
+        # the last position whose 3 bytes are inside the run
+        last = first + n - 3
+        data = self.data
+        if (self.index != first or first < d or last < first + d
+                or data[first - d:first + n - d] != data[first:first + n]):
+            self.advance(n)
+            return
+
+        # the link of each position in a period, as a distance back to the
+        # nearest earlier position with the same hash
+        hashes = [self.hash3(first + r) for r in range(d)]
+        backs = [next(j for j in range(1, d + 1) if hashes[(r - j) % d] == h)
+                 for r, h in enumerate(hashes)]
+        size = self.size
+        mask = size - 1
+        prev = self.prev
+        # only the last size positions keep their slot in the ring
+        low = max(first, last + 1 - size)
+        for r in range(d):
+            pos = low + (first + r - low) % d
+            while pos <= last:
+                slot = pos & mask
+                count = min((last - pos) // d + 1, (size - slot + d - 1) // d)
+                prev[slot:slot + count * d:d] = array(
+                    'i', range(pos - backs[r], pos - backs[r] + count * d, d))
+                pos += count * d
+        for pos in range(last - d + 1, last + 1):
+            self.head[hashes[(pos - first) % d]] = pos
+
+        self.stop = self.index = last + 1
+        if size <= self.stop:
+            self.full = True
+            self.start = max(self.start, self.stop - size)
+        # the last 2 positions read past the run
+        self.advance(first + n - self.stop)
+
+    def search(self):
+        match_max = self.match_max
+        match_min = self.match_min
+        index = self.index
+
+        self.searches += 1
+
+        # the hash looks at 3 bytes, or finds the end of the data
+        self.look(index + 2)
+        if len(self.data) <= index + 2:
+            return None
+
+        # walk the chain newest first, then try candidates oldest first like
+        # SlidingWindow does so that ties resolve the same way
+        n = self.walk(self.head[self.hash3(index)], self.max_chain)
+
+        cand = self.cand
+        data = self.data
+        end = len(data)
+        best = None
+        bestlen = match_min - 1
+        for k in range(n - 1, -1, -1):
+            i = cand[k]
+            disp = index - i
+            if disp < self.disp_min:
+                continue
+            # a candidate can only beat the best match so far if it also
+            # matches the byte just past it
+            if end <= index + bestlen:
+                break
+            if data[i + bestlen] != data[index + bestlen]:
+                continue
+            matchlen = self.match(i, index)
+            if matchlen > bestlen:
+                if matchlen >= match_max:
+                    self.look(index + matchlen)
+                    return (matchlen, -disp)
+                best = (matchlen, -disp)
+                bestlen = matchlen
+
+        # the quick check above looked at index + bestlen too
+        self.look(index + bestlen)
+        return best
+
+class NLZ10HashWindow(HashChainWindow, NLZ10Window):
+    pass
+
+class NLZ11HashWindow(HashChainWindow, NLZ11Window):
+    pass
+
+class NOverlayHashWindow(HashChainWindow, NOverlayWindow):
+    pass
+
+# The size of the blocks read from file inputs
+BLOCK_SIZE = 0x10000
+
+def _chunks(input):
+    """Split input into chunks. input is a bytes-like object, a readable
+    binary file or an iterable of bytes-like chunks."""
+    if hasattr(input, 'read'):
+        return iter(lambda: input.read(BLOCK_SIZE), b'')
+    if isinstance(input, (bytes, bytearray, memoryview)):
+        view = memoryview(input).cast('B')
+        return (view[i:i + BLOCK_SIZE] for i in range(0, len(view), BLOCK_SIZE))
+    return iter(input)
+
+# The compressor version. Bump it whenever the output for the same input
+# and settings changes, so that cached outputs are not reused.
+VERSION = 3
+
+# Compression levels
+GREEDY = 1
+LAZY = 2
+OPTIMAL = 3
+
+class _Input:
+    """The input buffer behind a window, filled from the input chunks as the
+    window moves forward."""
+
+    def __init__(self, window, input):
+        self.window = window
+        self.chunks = _chunks(input)
+        self.eof = False
+
+    def fill(self, n):
+        """Buffer n bytes from the window index on, or as many as the input
+        has left, and return how many are buffered."""
+        data = self.window.data
+        while not self.eof and len(data) - self.window.index < n:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.eof = True
+            else:
+                data.extend(chunk)
+        return len(data) - self.window.index
+
+    def trim(self):
+        """Drop history that has slid out of the window."""
+        window = self.window
+        if 4 * window.size <= window.start:
+            window.rebase(window.start - window.start % window.size)
+
+def _token(match):
+    """Pack a (count, -disp) match into a token (see _compress)."""
+    return match[0] << 12 | (-match[1] - 1)
+
+def _greedy(window, input):
+    """Greedy parsing: the longest match at every position. Runs (see
+    SlidingWindow.run) are taken without a search and skipped over."""
+    while input.fill(window.lookahead):
+        match = window.run()
+        if match:
+            yield _token(match)
+            window.skip(match[0])
+            input.trim()
+            continue
 
-    i = 0
-    while True:
-        if len(input) <= i:
-            break
         match = window.search()
         if match:
-            yield match
-            #if match[1] == -283:
-            #    raise Exception(match, i)
+            yield _token(match)
             window.advance(match[0])
-            i += match[0]
         else:
-            yield input[i]
+            yield window.data[window.index]
             window.next()
-            i += 1
+        input.trim()
 
-def packflags(flags):
-    n = 0
-    for i in range(8):
-        n <<= 1
-        try:
-            if flags[i]:
-                n |= 1
-        except IndexError:
-            pass
-    return n
-
-def chunkit(it, n):
-    buf = []
-    for x in it:
-        buf.append(x)
-        if n <= len(buf):
-            yield buf
-            buf = []
+def _lazy(window, input):
+    """Greedy parsing with one step of lazy matching: a match is put off by
+    a literal if the next byte starts one at least two bytes longer, which
+    pays for the literal."""
+    data = window.data
+    match = None
+    # one more byte for the search at the next position
+    while input.fill(window.lookahead + 1):
+        if match is None:
+            match = window.run()
+            if match:
+                yield _token(match)
+                window.skip(match[0])
+                match = None
+                input.trim()
+                continue
+            match = window.search()
+        if match is None:
+            yield data[window.index]
+            window.next()
+        elif match[0] < window.match_max:
+            window.next()
+            following = None
+            if window.index < len(data):
+                following = window.search()
+            if following and match[0] + 1 < following[0]:
+                yield data[window.index - 1]
+                match = following
+                continue
+            yield _token(match)
+            window.advance(match[0] - 1)
+        else:
+            yield _token(match)
+            window.advance(match[0])
+        match = None
+        input.trim()
+
+def _optimal(window, input, nice=128):
+    """Optimal parsing over blocks of about one window size of positions.
+
+    The longest match is found at every position of a block; since every
+    prefix of a match is a match too, the cheapest parse of the block in
+    bits (flag bit included) follows by dynamic programming. Each match
+    offers one price per token encoding to a contiguous range of end
+    positions, so the offers are kept in a heap instead of relaxing every
+    length one by one.
+
+    Positions covered by a match of `nice` bytes or more are not searched,
+    which keeps long runs from being searched byte by byte; the parse can
+    still end a literal or a shorter match inside them. A run found by
+    run() saves the search too, and is skipped over.
+    """
+    data = window.data
+    match_min = window.match_min
+    prices = [(count, 1 + 8 * size) for count, size in window.token_sizes]
+
+    while input.fill(window.lookahead):
+        base = window.index
+        matches = []
+        while len(matches) < window.size and input.fill(window.lookahead):
+            match = window.run()
+            if match and nice <= match[0]:
+                matches.append(match)
+                matches.extend([None] * (match[0] - 1))
+                window.skip(match[0])
+                continue
+            match = window.search()
+            matches.append(match)
+            if match and nice <= match[0]:
+                matches.extend([None] * (match[0] - 1))
+                window.advance(match[0])
+            else:
+                window.next()
+
+        m = len(matches)
+        cost = [0] * (m + 1)
+        choice = [None] * (m + 1)
+        starts = [[] for _ in range(m + 1)]
+        offers = []
+        for k in range(m + 1):
+            for offer in starts[k]:
+                heappush(offers, offer)
+            while offers and offers[0][1] < k:
+                heappop(offers)
+            if k:
+                # 9 bits for a literal
+                cost[k] = cost[k - 1] + 9
+                if offers and offers[0][0] < cost[k]:
+                    cost[k], _, choice[k] = offers[0]
+            if k == m:
+                break
+
+            match = matches[k]
+            if match is None:
+                continue
+            top = min(match[0], m - k)
+            lo = match_min
+            for count, price in prices:
+                hi = min(count, top)
+                if lo <= hi:
+                    starts[k + lo].append((cost[k] + price, k + hi, k))
+                lo = count + 1
+
+        # walk the cheapest parse back from the end of the block
+        tokens = array('I')
+        k = m
+        while k:
+            start = choice[k]
+            if start is None:
+                start = k - 1
+                tokens.append(data[base + start])
+            else:
+                tokens.append(_token((k - start, matches[start][1])))
+            k = start
+        yield from reversed(tokens)
+        input.trim()
+
+_parsers = {
+    GREEDY: _greedy,
+    LAZY: _lazy,
+    OPTIMAL: _optimal,
+}
+
+# The number of input bytes each worker parses in parallel mode
+SEGMENT_SIZE = 0x10000
+
+def _segments(input, n):
+    """Split input into bytes objects of n bytes; the last may be shorter."""
+    buf = bytearray()
+    for chunk in _chunks(input):
+        buf += chunk
+        while n <= len(buf):
+            yield bytes(buf[:n])
+            del buf[:n]
     if buf:
-        yield buf
+        yield bytes(buf)
 
-def compress(input, out):
-    # header
-    out.write(pack("<L", (len(input) << 8) + 0x10))
+def _parse_segment(windowclass, level, history, segment):
+    """Return the tokens for segment, with history (at most a window size
+    of the input just before it) already in the window."""
+    window = windowclass(bytearray(history) + segment)
+    window.advance(len(history))
+    tokens = array('I', _parsers[level](window, _Input(window, ())))
+    return tokens, window.searches, window.candidates
 
-    # body
-    length = 0
-    for tokens in chunkit(_compress(input), 8):
-        flags = [type(t) == tuple for t in tokens]
-        out.write(pack(">B", packflags(flags)))
+def _counted(tokens, window, stats):
+    """Pass tokens through, then add the searches of window to stats."""
+    yield from tokens
+    stats.searches += window.searches
+    stats.candidates += window.candidates
 
-        for t in tokens:
-            if type(t) == tuple:
-                count, disp = t
-                count -= 3
-                disp = (-disp) - 1
-                assert 0 <= disp < 4096
-                sh = (count << 12) | disp
-                out.write(pack(">H", sh))
+def _compress_parallel(input, windowclass, level, processes, segment_size,
+                       stats=None):
+    """Generates the tokens of _compress() from segments parsed in worker
+    processes.
+
+    Each worker gets the window size of input before its segment as
+    history, so only matches that would run past the end of a segment are
+    lost: the token streams of the segments are simply concatenated."""
+    def jobs():
+        history = b''
+        for segment in _segments(input, segment_size):
+            yield history, segment
+            history = (history + segment)[-windowclass.size:]
+
+    with ProcessPoolExecutor(processes) as executor:
+        futures = [executor.submit(_parse_segment, windowclass, level, *job)
+                   for job in jobs()]
+        for future in futures:
+            tokens, searches, candidates = future.result()
+            yield from tokens
+            if stats is not None:
+                stats.searches += searches
+                stats.candidates += candidates
+
+def _compress(input, windowclass=NLZ10Window, level=GREEDY, processes=None,
+              segment_size=SEGMENT_SIZE, stats=None):
+    """Generates a stream of tokens packed in ints: a literal is its byte,
+    a back-reference is count << 12 | (displacement - 1), so any token of
+    0x1000 or more is a back-reference.
+
+    input is read in chunks (see _chunks). Only the window and its
+    lookahead are kept, plus up to a few window sizes of history
+    that are dropped in one go.
+
+    If processes is not None the input is parsed in segment_size segments
+    by that many worker processes instead (see _compress_parallel); 0 uses
+    every CPU.
+
+    The searches made are added to stats, if given, once the stream ends."""
+    if processes is not None:
+        return _compress_parallel(input, windowclass, level,
+                                  processes or None, segment_size, stats)
+    window = windowclass(bytearray())
+    tokens = _parsers[level](window, _Input(window, input))
+    if stats is not None:
+        tokens = _counted(tokens, window, stats)
+    return tokens
+
+def _bucket(n):
+    """The power of two at or below n, which labels its histogram bucket."""
+    return 1 << (n.bit_length() - 1)
+
+class CompressionStats:
+    """What a compression did: token counts, histograms of match lengths
+    and displacements (bucketed by powers of two), back-references by
+    encoded size, search effort, and the time spent finding matches versus
+    encoding them.
+
+    Pass stats=True to compress() or compress_nlz11() to get one back.
+    """
+
+    def __init__(self, windowclass):
+        self.sizes = windowclass.token_sizes
+        self.input_size = 0
+        self.output_size = 0
+        self.literals = 0
+        self.matches = 0
+        self.match_lengths = Counter()
+        self.displacements = Counter()
+        # back-references by their size in bytes
+        self.token_sizes = Counter()
+        self.searches = 0
+        self.candidates = 0
+        self.parse_time = 0.0
+        self.emit_time = 0.0
+
+    @property
+    def candidates_per_search(self):
+        return self.candidates / self.searches if self.searches else 0.0
+
+    def add(self, tokens):
+        """Count an array of tokens."""
+        matches = [t for t in tokens if 0x1000 <= t]
+        self.literals += len(tokens) - len(matches)
+        self.matches += len(matches)
+        for t in matches:
+            count = t >> 12
+            self.match_lengths[_bucket(count)] += 1
+            self.displacements[_bucket((t & 0xFFF) + 1)] += 1
+            for longest, size in self.sizes:
+                if count <= longest:
+                    self.token_sizes[size] += 1
+                    break
+
+    def as_dict(self):
+        return {
+            "input_size": self.input_size,
+            "output_size": self.output_size,
+            "literals": self.literals,
+            "matches": self.matches,
+            "match_lengths": dict(sorted(self.match_lengths.items())),
+            "displacements": dict(sorted(self.displacements.items())),
+            "token_sizes": dict(sorted(self.token_sizes.items())),
+            "searches": self.searches,
+            "candidates_per_search": self.candidates_per_search,
+            "parse_time": self.parse_time,
+            "emit_time": self.emit_time,
+        }
+
+    def report(self):
+        """Return the stats as lines of text."""
+        def histogram(title, counter):
+            lines.append(title)
+            for low, n in sorted(counter.items()):
+                lines.append("  %6d-%-6d %8d" % (low, 2 * low - 1, n))
+
+        ratio = self.output_size / self.input_size if self.input_size else 0
+        lines = [
+            "input       %10d bytes" % self.input_size,
+            "output      %10d bytes (%.2f%%)" % (self.output_size,
+                                                 100 * ratio),
+            "literals    %10d" % self.literals,
+            "matches     %10d" % self.matches,
+        ]
+        for size, n in sorted(self.token_sizes.items()):
+            lines.append("  %d-byte    %10d" % (size, n))
+        histogram("match lengths", self.match_lengths)
+        histogram("displacements", self.displacements)
+        lines += [
+            "searches    %10d (%.1f candidates each)"
+            % (self.searches, self.candidates_per_search),
+            "match time  %10.3f s" % self.parse_time,
+            "emit time   %10.3f s" % self.emit_time,
+        ]
+        return "\n".join(lines)
+
+# The number of tokens encoded into one output block. A multiple of 8, so
+# that a flag byte never covers tokens of two blocks.
+TOKEN_BLOCK = 0x8000
+
+def _emit_nlz10(tokens):
+    """Encode tokens (an array of at most TOKEN_BLOCK tokens) into one
+    bytearray. Returns it and the number of bytes the tokens decode to.
+
+    Bytes are appended rather than stored at a running index, and the
+    decoded size is summed per flag group: byte values and per-group sums
+    are cached small ints, while an index or total past 256 would be a new
+    int object for every token."""
+    buf = bytearray()
+    append = buf.append
+    consumed = used = 0
+    flagpos = flags = bit = 0
+    for t in tokens:
+        if not bit:
+            if buf:
+                buf[flagpos] = flags
+            consumed += used
+            flagpos = len(buf)
+            append(0)
+            flags = used = 0
+            bit = 0x80
+        if t < 0x1000:
+            append(t)
+            used += 1
+        else:
+            flags |= bit
+            used += t >> 12
+            # count - 3 in the top nibble, disp - 1 below
+            t -= 0x3000
+            assert t < 0x10000
+            append(t >> 8)
+            append(t & 0xFF)
+        bit >>= 1
+    if buf:
+        buf[flagpos] = flags
+    return buf, consumed + used
+
+def _emit_nlz11(tokens):
+    """Encode tokens into one bytearray, like _emit_nlz10()."""
+    buf = bytearray()
+    append = buf.append
+    consumed = used = 0
+    flagpos = flags = bit = 0
+    for t in tokens:
+        if not bit:
+            if buf:
+                buf[flagpos] = flags
+            consumed += used
+            flagpos = len(buf)
+            append(0)
+            flags = used = 0
+            bit = 0x80
+        if t < 0x1000:
+            append(t)
+            used += 1
+        else:
+            flags |= bit
+            used += t >> 12
+            if t < 0x11000:
+                # count - 1 in the top nibble, disp - 1 below
+                t -= 0x1000
+                append(t >> 8)
+                append(t & 0xFF)
+            elif t < 0x111000:
+                # 0, then count - 0x11 in 8 bits, then disp - 1
+                t -= 0x11000
+                append(t >> 16)
+                append((t >> 8) & 0xFF)
+                append(t & 0xFF)
             else:
-                out.write(pack(">B", t))
+                # 1, then count - 0x111 in 16 bits, then disp - 1
+                t += 0x10000000 - 0x111000
+                if 0x20000000 <= t:
+                    raise ValueError(t >> 12)
+                append(t >> 24)
+                append((t >> 16) & 0xFF)
+                append((t >> 8) & 0xFF)
+                append(t & 0xFF)
+        bit >>= 1
+    if buf:
+        buf[flagpos] = flags
+    return buf, consumed + used
 
-        length += 1
-        length += sum(2 if f else 1 for f in flags)
+def _write(tokens, out, magic, emit, size, stats=None):
+    """Write the header, tokens and padding to out.
 
-    # padding
-    padding = 4 - (length % 4 or 4)
-    if padding:
-        out.write(b'\xff' * padding)
+    Tokens are collected into an array and encoded by emit TOKEN_BLOCK at a
+    time, so an input that fits one block is written with a single write
+    after the header. If size is None the header is written last, which
+    needs a seekable out.
 
-def compress_nlz11(input, out):
+    If stats is given the tokens are counted into it, and the time spent
+    producing tokens and encoding them is added up.
+    """
     # header
-    out.write(pack("<L", (len(input) << 8) + 0x11))
+    if size is None:
+        header_pos = out.tell()
+        out.write(bytes(4))
+    else:
+        out.write(pack("<L", (size << 8) + magic))
 
     # body
+    tokens = iter(tokens)
+    block = array('I')
     length = 0
-    for tokens in chunkit(_compress(input, windowclass=NLZ11Window), 8):
-        flags = [type(t) == tuple for t in tokens]
-        out.write(pack(">B", packflags(flags)))
-        length += 1
-
-        for t in tokens:
-            if type(t) == tuple:
-                count, disp = t
-                disp = (-disp) - 1
-                #if disp == 282:
-                #    raise Exception
-                assert 0 <= disp <= 0xFFF
-                if count <= 1 + 0xF:
-                    count -= 1
-                    assert 2 <= count <= 0xF
-                    sh = (count << 12) | disp
-                    out.write(pack(">H", sh))
-                    length += 2
-                elif count <= 0x11 + 0xFF:
-                    count -= 0x11
-                    assert 0 <= count <= 0xFF
-                    b = count >> 4
-                    sh = ((count & 0xF) << 12) | disp
-                    out.write(pack(">BH", b, sh))
-                    length += 3
-                elif count <= 0x111 + 0xFFFF:
-                    count -= 0x111
-                    assert 0 <= count <= 0xFFFF
-                    l = (1 << 28) | (count << 12) | disp
-                    out.write(pack(">L", l))
-                    length += 4
-                else:
-                    raise ValueError(count)
-            else:
-                out.write(pack(">B", t))
-                length += 1
+    consumed = 0
+    while True:
+        if stats is not None:
+            start = perf_counter()
+            block.extend(islice(tokens, TOKEN_BLOCK))
+            stats.parse_time += perf_counter() - start
+            stats.add(block)
+            start = perf_counter()
+            buf, n = emit(block)
+            stats.emit_time += perf_counter() - start
+        else:
+            block.extend(islice(tokens, TOKEN_BLOCK))
+            buf, n = emit(block)
+        length += len(buf)
+        consumed += n
+        if len(block) < TOKEN_BLOCK:
+            break
+        out.write(buf)
+        del block[:]
 
     # padding
     padding = 4 - (length % 4 or 4)
-    if padding:
-        out.write(b'\xff' * padding)
+    buf += b'\xff' * padding
+    out.write(buf)
+    if stats is not None:
+        stats.input_size += consumed
+        stats.output_size += 4 + length + padding
 
-def dump_compress_nlz11(input, out):
-    # body
-    length = 0
-    def dump():
-        for t in _compress(input, windowclass=NLZ11Window):
-            if type(t) == tuple:
-                yield t
-    from pprint import pprint
-    pprint(list(dump()))
+    if size is None:
+        end = out.tell()
+        out.seek(header_pos)
+        out.write(pack("<L", (consumed << 8) + magic))
+        out.seek(end)
+    elif size != consumed:
+        raise ValueError("header size %d but input was %d bytes"
+                         % (size, consumed))
+
+def _input_size(input, size):
+    if size is None and isinstance(input, (bytes, bytearray, memoryview)):
+        return memoryview(input).nbytes
+    return size
+
+def _compress_to(input, out, windowclass, magic, emit, size, level,
+                 processes, stats):
+    if stats is True:
+        stats = CompressionStats(windowclass)
+    elif not stats:
+        stats = None
+    _write(_compress(input, windowclass=windowclass, level=level,
+                     processes=processes, stats=stats),
+           out, magic, emit, _input_size(input, size), stats)
+    return stats
+
+def compress(input, out, windowclass=NLZ10Window, size=None, level=GREEDY,
+             processes=None, stats=None):
+    """LZ10-compress input to out.
+
+    input is a bytes-like object, a readable binary file or an iterable of
+    chunks; it is compressed as it is read. The decompressed size goes in
+    the header: pass size when it is known up front for a file or chunk
+    input, otherwise out must be seekable so the header can be patched.
+
+    level is GREEDY (the longest match at every position), LAZY (one step
+    of lazy matching) or OPTIMAL (see _optimal); higher levels give smaller
+    output for more time.
+
+    processes parses the input in segments on that many worker processes
+    (0 for one per CPU). The output is a valid stream of the same data but
+    slightly larger, since no match crosses a segment boundary.
+
+    stats=True returns a CompressionStats for the run; passing a
+    CompressionStats adds to it instead.
+    """
+    return _compress_to(input, out, windowclass, 0x10, _emit_nlz10, size,
+                        level, processes, stats)
+
+def compress_nlz11(input, out, windowclass=NLZ11Window, size=None,
+                   level=GREEDY, processes=None, stats=None):
+    """LZ11-compress input to out. Takes the same arguments as compress()."""
+    return _compress_to(input, out, windowclass, 0x11, _emit_nlz11, size,
+                        level, processes, stats)
+
+class NLZ10Decoder:
+    """Incremental LZ10 decoder.
+
+    feed() takes the compressed stream in chunks of any size and returns a
+    memoryview of the bytes decoded from it. The output is a bytearray
+    allocated once from the size in the header; input that does not yet
+    hold a whole token is kept until the next feed().
+    """
+
+    magic = 0x10
+
+    def __init__(self):
+        self.pending = bytearray()
+        self.output = None
+        self.pos = 0
+
+        # the current flag byte and the number of its bits not yet used
+        self.flags = 0
+        self.nflags = 0
+
+    @property
+    def done(self):
+        return self.output is not None and len(self.output) <= self.pos
+
+    def token(self, buf, i):
+        """Parse the back-reference at buf[i]. Returns (count, disp, size)
+        or None if buf does not hold the whole token yet."""
+        if len(buf) < i + 2:
+            return None
+        b0, b1 = buf[i], buf[i + 1]
+        return (b0 >> 4) + 3, ((b0 & 0xF) << 8 | b1) + 1, 2
+
+    def feed(self, chunk):
+        buf = self.pending
+        buf += chunk
+        i = 0
+
+        if self.output is None:
+            if len(buf) < 4:
+                return memoryview(b'')
+            header, = unpack("<L", buf[:4])
+            if header & 0xFF != self.magic:
+                raise ValueError("not an LZ%02X stream: 0x%02X"
+                                 % (self.magic, header & 0xFF))
+            self.output = bytearray(header >> 8)
+            i = 4
+
+        out = self.output
+        end = len(out)
+        start = pos = self.pos
+        flags = self.flags
+        nflags = self.nflags
+        n = len(buf)
+
+        while pos < end:
+            if not nflags:
+                # eight literals in a row can be copied in one go
+                if buf[i:i + 1] == b'\x00' and i + 9 <= n and pos + 8 <= end:
+                    out[pos:pos + 8] = buf[i + 1:i + 9]
+                    pos += 8
+                    i += 9
+                    continue
+                if n <= i:
+                    break
+                flags = buf[i]
+                nflags = 8
+                i += 1
+
+            if flags & 0x80:
+                token = self.token(buf, i)
+                if token is None:
+                    break
+                count, disp, size = token
+                if pos < disp:
+                    raise ValueError("displacement %d before start of output"
+                                     " at %d" % (disp, pos))
+                if end - pos < count:
+                    raise ValueError("copy of %d bytes past end of output"
+                                     " at %d" % (count, pos))
+                i += size
+
+                # Copy with slice doubling: out[src:pos] repeats every disp
+                # bytes, so each slice can be as long as everything copied
+                # so far.
+                src = pos - disp
+                stop = pos + count
+                while pos < stop:
+                    step = min(pos - src, stop - pos)
+                    out[pos:pos + step] = out[src:src + step]
+                    pos += step
+            else:
+                if n <= i:
+                    break
+                out[pos] = buf[i]
+                pos += 1
+                i += 1
+
+            flags = (flags << 1) & 0xFF
+            nflags -= 1
+
+        del buf[:i]
+        self.pos = pos
+        self.flags = flags
+        self.nflags = nflags
+        return memoryview(out)[start:pos]
+
+class NLZ11Decoder(NLZ10Decoder):
+    magic = 0x11
+
+    def token(self, buf, i):
+        n = len(buf)
+        if n < i + 2:
+            return None
+        b0, b1 = buf[i], buf[i + 1]
+        indicator = b0 >> 4
+        if indicator == 0:
+            if n < i + 3:
+                return None
+            b2 = buf[i + 2]
+            count = ((b0 & 0xF) << 4 | b1 >> 4) + 0x11
+            return count, ((b1 & 0xF) << 8 | b2) + 1, 3
+        elif indicator == 1:
+            if n < i + 4:
+                return None
+            b2, b3 = buf[i + 2], buf[i + 3]
+            count = ((b0 & 0xF) << 12 | b1 << 4 | b2 >> 4) + 0x111
+            return count, ((b2 & 0xF) << 8 | b3) + 1, 4
+        else:
+            return indicator + 1, ((b0 & 0xF) << 8 | b1) + 1, 2
+
+def _decompress(input, decoderclass):
+    decoder = decoderclass()
+    decoder.feed(input)
+    if not decoder.done:
+        raise ValueError("truncated LZ%02X stream" % decoderclass.magic)
+    return decoder.output
+
+def decompress_nlz10(input):
+    """Decompress a whole LZ10 stream into a new bytearray."""
+    return _decompress(input, NLZ10Decoder)
+
+def decompress_nlz11(input):
+    """Decompress a whole LZ11 stream into a new bytearray."""
+    return _decompress(input, NLZ11Decoder)
+
+class Codec:
+    """A compressed format together with the window class that finds its
+    matches.
+
+    compress() takes the same arguments as the module-level compress()
+    except windowclass; decompress() decodes a whole stream.
+    """
+
+    def __init__(self, name, magic, windowclass, emit, decoderclass):
+        self.name = name
+        self.magic = magic
+        self.windowclass = windowclass
+        self.emit = emit
+        self.decoderclass = decoderclass
+
+    def __repr__(self):
+        return "<Codec %s>" % self.name
+
+    def compress(self, input, out, size=None, level=GREEDY, processes=None,
+                 stats=None):
+        return _compress_to(input, out, self.windowclass, self.magic,
+                            self.emit, size, level, processes, stats)
+
+    def decompress(self, input):
+        return _decompress(input, self.decoderclass)
+
+# Every format and match finder combination, by name
+CODECS = {}
+
+def register_codec(codec):
+    CODECS[codec.name] = codec
+    return codec
+
+def get_codec(name):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError("unknown codec %r, expected one of %s"
+                         % (name, ", ".join(sorted(CODECS))))
+
+register_codec(Codec('lz10', 0x10, NLZ10Window, _emit_nlz10, NLZ10Decoder))
+register_codec(Codec('lz10-hash', 0x10, NLZ10HashWindow, _emit_nlz10,
+                     NLZ10Decoder))
+register_codec(Codec('lz11', 0x11, NLZ11Window, _emit_nlz11, NLZ11Decoder))
+register_codec(Codec('lz11-hash', 0x11, NLZ11HashWindow, _emit_nlz11,
+                     NLZ11Decoder))
+register_codec(Codec('overlay', 0x10, NOverlayWindow, _emit_nlz10,
+                     NLZ10Decoder))
+register_codec(Codec('overlay-hash', 0x10, NOverlayHashWindow, _emit_nlz10,
+                     NLZ10Decoder))
+
+# estimate_nlz11_size() parses blocks of ESTIMATE_BLOCK bytes until it has
+# made about one search per ESTIMATE_EFFORT bytes of input, and at least
+# ESTIMATE_MIN_BLOCKS blocks
+ESTIMATE_BLOCK = 0x400
+ESTIMATE_EFFORT = 128
+ESTIMATE_MIN_BLOCKS = 8
+
+def _spread(n):
+    """Yield range(n) in bit-reversed order, so that the numbers yielded
+    so far are always spread evenly over the range."""
+    bits = (n - 1).bit_length()
+    for k in range(1 << bits):
+        i = int(format(k, '0%db' % bits)[::-1], 2) if bits else 0
+        if i < n:
+            yield i
+
+def _estimate_block(window, start, stop):
+    """Greedily parse window.data[start:stop] and return (size, searches):
+    the encoded size of the tokens including their flag bits, and the
+    number of searches made.
+
+    The longest match at each position is found with bytes.find over the
+    window rather than with an index, so the block needs no history built
+    up; only the tie between matches of equal length, which does not
+    change the size, may be broken differently from the window's search().
+    A match that runs past stop is counted for the share of it before stop.
+    """
+    data = window.data
+    view = memoryview(data)
+    end = len(data)
+    disp_min = window.disp_min
+    match_min = window.match_min
+    token_sizes = window.token_sizes
+
+    size = 0.0
+    tokens = 0.0
+    searches = 0
+    pos = start
+    while pos < stop:
+        searches += 1
+        lo = max(0, pos - window.size)
+        n = match_min
+        i = -1
+        if pos + n <= end:
+            i = data.find(view[pos:pos + n], lo, pos - disp_min + n)
+        if i < 0:
+            size += 1
+            tokens += 1
+            pos += 1
+            continue
+
+        # extend the nearest match, then look for a longer one until none
+        window.index = pos
+        while True:
+            n = window.match(i, pos)
+            if end <= pos + n or window.match_max <= n:
+                break
+            searches += 1
+            i = data.find(view[pos:pos + n + 1], lo, pos - disp_min + n + 1)
+            if i < 0:
+                break
+
+        share = min(n, stop - pos) / n
+        for longest, token_size in token_sizes:
+            if n <= longest:
+                size += share * token_size
+                break
+        tokens += share
+        pos += n
+    return size + tokens / 8, searches
+
+def estimate_nlz11_size(input, windowclass=NLZ11Window):
+    """Estimate the size of the GREEDY compress_nlz11() output for the
+    bytes-like input, much faster than compressing it. Returns (size,
+    error): the real size is within size +- error unless the input is far
+    from uniform at the scale of ESTIMATE_BLOCK.
+
+    Blocks of the input are parsed with a cheap match finder (see
+    _estimate_block), in an order that keeps the blocks parsed so far
+    spread evenly over the input, until ESTIMATE_EFFORT is spent. The size
+    is extrapolated from the parsed blocks by their bytes. error is three
+    standard errors of the extrapolation, none if every block was parsed,
+    plus a byte per block for the matches cut at block edges.
+
+    On the theme body this takes about 1/50 of the time of a GREEDY
+    compression with NLZ11HashWindow, and the real size is within 12%.
+    """
+    data = bytes(input)
+    total = len(data)
+    blocks = -(-total // ESTIMATE_BLOCK)
+    window = windowclass(data)
+    budget = total // ESTIMATE_EFFORT
+
+    # header and worst-case padding
+    overhead = 4 + 3
+    sizes = []
+    lengths = []
+    searches = 0
+    for i in _spread(blocks):
+        start = i * ESTIMATE_BLOCK
+        stop = min(start + ESTIMATE_BLOCK, total)
+        size, n = _estimate_block(window, start, stop)
+        sizes.append(size)
+        lengths.append(stop - start)
+        searches += n
+        if budget <= searches and ESTIMATE_MIN_BLOCKS <= len(sizes):
+            break
+
+    if not sizes:
+        return overhead, 0
+    rate = sum(sizes) / sum(lengths)
+    size = round(rate * total) + overhead
+    # matches cut at block edges are counted by share; allow a byte a block
+    edges = blocks
+    n = len(sizes)
+    if n == blocks:
+        return size, edges
+
+    # the standard error of a ratio estimate from n of the blocks, sampled
+    # without replacement
+    residuals = [c - rate * l for c, l in zip(sizes, lengths)]
+    variance = sum(r * r for r in residuals) / (n - 1)
+    error = blocks * (variance / n * (1 - n / blocks)) ** 0.5
+    return size, round(3 * error) + edges
+
+# The input is handed to the compressor in blocks of this size by
+# compress_nlz11_async, which reports progress between blocks
+PROGRESS_BLOCK = 0x4000
+
+class _Cancelled(Exception):
+    pass
+
+def _progress_chunks(input, report):
+    """Yield input in PROGRESS_BLOCK chunks, calling report with the number
+    of bytes the compressor has taken so far each time it asks for more."""
+    view = memoryview(input).cast('B')
+    for i in range(0, len(view), PROGRESS_BLOCK):
+        report(i)
+        yield view[i:i + PROGRESS_BLOCK]
+    report(len(view))
+
+def _compress_worker(input, windowclass, level, conn):
+    """Compress input in a worker process, sending progress through conn and
+    giving up as soon as anything is received from it. Sends None last."""
+    def report(done):
+        if conn.poll():
+            raise _Cancelled
+        conn.send(done)
+
+    try:
+        out = BytesIO()
+        compress_nlz11(_progress_chunks(input, report), out,
+                       windowclass=windowclass, size=len(input), level=level)
+        return out.getvalue()
+    finally:
+        conn.send(None)
+        conn.close()
+
+async def compress_nlz11_async(input, windowclass=NLZ11Window, level=GREEDY,
+                               progress=None, executor=None):
+    """LZ11-compress the bytes-like input in a worker process without
+    blocking the event loop, and return the stream as bytes.
+
+    progress is called on the event loop with the number of input bytes
+    compressed so far, each PROGRESS_BLOCK bytes. executor is the
+    ProcessPoolExecutor to run on; by default a new one-process pool is
+    used for the call. Cancelling the task stops the worker at its next
+    progress report.
+    """
+    input = bytes(input)
+    loop = asyncio.get_running_loop()
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=1)
+    conn, worker_conn = Pipe()
+    try:
+        future = loop.run_in_executor(executor, _compress_worker, input,
+                                      windowclass, level, worker_conn)
+        try:
+            # poll with a timeout so that no thread is left blocked on conn
+            # if the worker dies or never starts
+            while True:
+                if await loop.run_in_executor(None, conn.poll, 0.1):
+                    done = conn.recv()
+                    if done is None:
+                        break
+                    if progress is not None:
+                        progress(done)
+                elif future.done():
+                    break
+            return await future
+        except asyncio.CancelledError:
+            conn.send(None)
+            future.cancel()
+            raise
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+# The number of input bytes between the checkpoints of an
+# IncrementalCompressor
+CHECKPOINT_INTERVAL = 0x8000
+
+class _Checkpoint:
+    def __init__(self, pos, horizon, offset, window):
+        # the input position and the output offset (after the header) of
+        # the next token, which starts a flag group
+        self.pos = pos
+        self.offset = offset
+        # the last input index any token before pos depends on
+        self.horizon = horizon
+        # the window at pos, without the lookahead
+        self.window = window
+
+class IncrementalCompressor:
+    """A GREEDY compressor that reuses the output of its last run.
+
+    Every interval bytes of input, compress() saves a checkpoint at the next
+    flag group: a copy of the window, the input position, the output
+    offset, and how far ahead every search so far has looked (see
+    SlidingWindow.look). The next compress() finds the first byte that
+    differs from the last input, copies the output up to the last
+    checkpoint whose searches all stopped before that byte and compresses
+    only the rest. The output is byte-identical to compress() or
+    compress_nlz11() at the GREEDY level.
+
+    The compressor pickles, so it can be kept between builds; `reused` is
+    the number of input bytes the last compress() did not compress again.
+    """
+
+    def __init__(self, codec='lz11-hash', interval=CHECKPOINT_INTERVAL):
+        self.codec = get_codec(codec)
+        self.interval = interval
+        self.data = b''
+        self.output = b''
+        self.checkpoints = []
+        self.reused = 0
+
+    def resume_point(self, data):
+        """Return the index of the checkpoint to resume data from, or -1."""
+        old = self.data
+        n = min(len(data), len(old))
+        first = 0
+        step = BLOCK_SIZE
+        while step:
+            while first + step <= n and data[first:first + step] == old[first:first + step]:
+                first += step
+            step >>= 1
+        resume = -1
+        for i, checkpoint in enumerate(self.checkpoints):
+            if first <= checkpoint.horizon:
+                break
+            resume = i
+        return resume
+
+    def compress(self, data):
+        """Compress data and return the whole stream as bytes."""
+        data = bytes(data)
+        if data == self.data:
+            self.reused = len(data)
+            return self.output
+
+        codec = self.codec
+        resume = self.resume_point(data)
+        if resume < 0:
+            checkpoints = []
+            pos = 0
+            body = bytearray()
+            window = codec.windowclass(bytearray())
+        else:
+            checkpoints = self.checkpoints[:resume + 1]
+            checkpoint = checkpoints[-1]
+            pos = checkpoint.pos
+            body = bytearray(self.output[4:4 + checkpoint.offset])
+            window = checkpoint.window.checkpoint()
+        self.reused = pos
+
+        view = memoryview(data)
+        tokens = _greedy(window, _Input(window, (view[pos:],)))
+        block = array('I')
+        due = pos + self.interval
+        for t in tokens:
+            # the window is at pos with the token t found
+            if due <= pos and len(block) % 8 == 0:
+                body += codec.emit(block)[0]
+                del block[:]
+                base = pos - window.index
+                checkpoints.append(_Checkpoint(pos, base + window.horizon,
+                                               len(body), window.checkpoint()))
+                due = pos + self.interval
+            block.append(t)
+            pos += t >> 12 if 0x1000 <= t else 1
+            if TOKEN_BLOCK <= len(block):
+                body += codec.emit(block)[0]
+                del block[:]
+        body += codec.emit(block)[0]
+        body += b'\xff' * (4 - (len(body) % 4 or 4))
+
+        self.data = data
+        self.output = pack("<L", (len(data) << 8) + codec.magic) + body
+        self.checkpoints = checkpoints
+        return self.output
 
 if __name__ == '__main__':
-    from sys import stdout, argv
-    data = open(argv[1], "rb").read()
-    stdout = stdout.detach()
-    #compress(data, stdout)
-    compress_nlz11(data, stdout)
+    from argparse import ArgumentParser
+    from sys import stdout
+
+    parser = ArgumentParser(description="LZ11-compress a file to stdout.")
+    parser.add_argument("input")
+    parser.add_argument("--codec", default='lz11', choices=sorted(CODECS))
+    parser.add_argument("--level", type=int, default=GREEDY,
+                        choices=sorted(_parsers))
+    parser.add_argument("--stats", action='store_true',
+                        help="print compression stats to stderr")
+    args = parser.parse_args()
 
-    #dump_compress_nlz11(data, stdout)
+    with open(args.input, "rb") as f:
+        stats = get_codec(args.codec).compress(f.read(), stdout.buffer,
+                                               level=args.level,
+                                               stats=args.stats)
+    if stats is not None:
+        print(stats.report(), file=stderr)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark every registered LZ codec over a fixed corpus.
+Reports compression and decompression speed (MB/s), ratio and the peak RSS
+of each run as JSON. Each run happens in a fresh process so that its peak
+RSS is its own. Each run also checks that the output decompresses to the
+input, and that the input fed in small chunks compresses to the same bytes.
+
+The corpus is two synthetic 512x256 RGB565 gradients, 64 KB of random
+data, and the real theme body and SMDH from iiSU_White_UI/ (run
+generate_real_binaries.py first).
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+from generate_real_binaries import OUTPUT_DIR, image_to_tiled_rgb565
+from lz11 import CODECS, get_codec, decompress_nlz11, GREEDY, LAZY, OPTIMAL
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+LEVELS = {
+    "greedy": GREEDY,
+    "lazy": LAZY,
+    "optimal": OPTIMAL,
+}
+
+TEX_W, TEX_H = 512, 256
+
+# Every run also compresses its input again in chunks of this many bytes,
+# which do not line up with the compressor's blocks, and checks that the
+# output is the same
+CHECK_CHUNK = 4093
+
+
+def gradient_texture(start, end, horizontal=False):
+    """A tiled RGB565 texture fading linearly from start to end."""
+    ramp = Image.linear_gradient('L').resize((TEX_W, TEX_H))
+    if horizontal:
+        ramp = ramp.transpose(Image.Transpose.ROTATE_90).resize((TEX_W, TEX_H))
+    bands = [ramp.point(lambda v, a=a, b=b: a + (b - a) * v // 255)
+             for a, b in zip(start, end)]
+    return image_to_tiled_rgb565(Image.merge('RGB', bands), TEX_W, TEX_H)
+
+
+def load_corpus():
+    """Return the corpus as a dict of name to bytes."""
+    corpus = {
+        "gradient-pastel": gradient_texture((255, 255, 255), (242, 242, 245)),
+        "gradient-full": gradient_texture((0, 0, 0), (255, 255, 255),
+                                          horizontal=True),
+        "random": random.Random(0).randbytes(0x10000),
+    }
+    with open(os.path.join(OUTPUT_DIR, "body_LZ.bin"), 'rb') as f:
+        corpus["theme-body"] = bytes(decompress_nlz11(f.read()))
+    with open(os.path.join(OUTPUT_DIR, "info.smdh"), 'rb') as f:
+        corpus["smdh"] = f.read()
+    return corpus
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def run_codec(name, data, level):
+    """Compress and decompress data with one codec; runs in a worker."""
+    codec = get_codec(name)
+    out_buf = io.BytesIO()
+    start = time.perf_counter()
+    codec.compress(data, out_buf, level=level)
+    compress_time = time.perf_counter() - start
+    compressed = out_buf.getvalue()
+
+    start = time.perf_counter()
+    decompressed = codec.decompress(compressed)
+    decompress_time = time.perf_counter() - start
+    if decompressed != data:
+        raise RuntimeError(f"{name} does not decompress to its input")
+
+    chunks = [data[i:i + CHECK_CHUNK] for i in range(0, len(data), CHECK_CHUNK)]
+    chunked_buf = io.BytesIO()
+    codec.compress(chunks, chunked_buf, level=level)
+    if chunked_buf.getvalue() != compressed:
+        raise RuntimeError(f"{name} compresses chunked input differently")
+
+    mb = len(data) / (1024 * 1024)
+    return {
+        "compressed": len(compressed),
+        "ratio": round(len(compressed) / len(data), 5),
+        "compress_mb_s": round(mb / compress_time, 3),
+        "decompress_mb_s": round(mb / decompress_time, 3),
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--codec", action="append", choices=sorted(CODECS),
+                        help="codec to run (repeatable; default all)")
+    parser.add_argument("--input", action="append",
+                        help="corpus entry to run (repeatable; default all)")
+    parser.add_argument("--level", choices=LEVELS, default="greedy")
+    parser.add_argument("-o", "--output", help="write the JSON here")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    names = args.codec or sorted(CODECS)
+    inputs = args.input or list(corpus)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+        for input_name in inputs:
+            data = corpus[input_name]
+            for name in names:
+                result = executor.submit(run_codec, name, data,
+                                         LEVELS[args.level]).result()
+                results.append({"codec": name, "input": input_name,
+                                "size": len(data), **result})
+                print(f"  {name:13s} {input_name:16s} "
+                      f"{result['compress_mb_s']:>8.3f} MB/s "
+                      f"{100*result['ratio']:>6.2f}%", file=sys.stderr)
+
+    report = {
+        "level": args.level,
+        "corpus": {name: len(corpus[name]) for name in inputs},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
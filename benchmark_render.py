@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Benchmark the theme renderers in generate_theme.py.
+Times each renderer against the implementation it replaced, kept here as
+the reference, checks how far apart their outputs are, and reports both
+as JSON.
+"""
+
+import argparse
+import json
+import sys
+import time
+from functools import partial
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+
+import generate_theme as theme
+from scene import Scene
+
+
+# === Reference implementations (before) ===
+
+def reference_vertical_gradient(width, height, top_color, bottom_color):
+    img = Image.new('RGBA', (width, height))
+    pixels = img.load()
+    for y in range(height):
+        t = y / max(height - 1, 1)
+        r = int(top_color[0] + (bottom_color[0] - top_color[0]) * t)
+        g = int(top_color[1] + (bottom_color[1] - top_color[1]) * t)
+        b = int(top_color[2] + (bottom_color[2] - top_color[2]) * t)
+        for x in range(width):
+            pixels[x, y] = (r, g, b, 255)
+    return img
+
+
+def reference_dotted_texture(width, height, spacing=10, dot_alpha=5):
+    texture = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    pixels = texture.load()
+    for y in range(0, height, spacing):
+        offset = (spacing // 2) if (y // spacing) % 2 else 0
+        for x in range(offset, width, spacing):
+            if 0 <= x < width and 0 <= y < height:
+                pixels[x, y] = (0, 0, 0, dot_alpha)
+    return texture
+
+
+def reference_soft_glow(img, cx, cy, rx, ry, color, intensity=12, blur=20):
+    glow = Image.new('RGBA', img.size, (0, 0, 0, 0))
+    gd = ImageDraw.Draw(glow)
+    for i in range(intensity, 0, -1):
+        alpha = int(intensity * (1 - i / intensity))
+        scale = 1 + i * 0.08
+        gd.ellipse(
+            (int(cx - rx * scale), int(cy - ry * scale),
+             int(cx + rx * scale), int(cy + ry * scale)),
+            fill=(*color[:3], alpha)
+        )
+    glow = glow.filter(ImageFilter.GaussianBlur(radius=blur))
+    return Image.alpha_composite(img, glow)
+
+
+def reference_drop_shadows(img, shadows, radius, blur=2):
+    for box, alpha in shadows:
+        shadow = Image.new('RGBA', img.size, (0, 0, 0, 0))
+        ImageDraw.Draw(shadow).rounded_rectangle(box, radius=radius,
+                                                 fill=(0, 0, 0, alpha))
+        shadow = shadow.filter(ImageFilter.GaussianBlur(radius=blur))
+        img = Image.alpha_composite(img, shadow)
+    return img
+
+
+def reference_icon_edit(scene, layer):
+    layers = [layer if l.name == layer.name else l for l in scene.layers]
+    return Scene(scene.size, scene.background, layers).flatten()
+
+
+def icon_edit(scene, layer):
+    """Swap in layer, re-rendering only what it touches, then swap the old
+    layer back so that every call starts from the same scene."""
+    old = scene.layer(layer.name)
+    scene.replace(layer)
+    image = scene.render()
+    scene.replace(old)
+    return image
+
+
+def glyph_sheet(render):
+    """All 15 icon glyphs, as drawn on unselected icons, side by side."""
+    tiles = [render(idx, theme.ACCENT_3, (255, 255, 255, 230)) for idx in range(15)]
+    sheet = Image.new('RGBA', (sum(t.width for t in tiles), tiles[0].height))
+    for i, tile in enumerate(tiles):
+        sheet.paste(tile, (i * tile.width, 0))
+    return sheet
+
+
+TOP_BASE = theme.create_vertical_gradient(412, 240, (255, 255, 255, 255),
+                                          (242, 242, 245, 255))
+TOP_GLOW = (TOP_BASE, 206, 112, 140, 70, theme.ACCENT_3, 15, 25)
+SMALL_GLOW = (TOP_BASE, 80, 60, 12, 8, theme.ACCENT_1, 12, 6)
+
+# The bottom screen's 5x3 icon grid, with the selected icon's darker shadow
+BOTTOM_BASE = theme.create_vertical_gradient(320, 240, (253, 253, 255, 255),
+                                             (244, 244, 247, 255))
+ICON_SHADOWS = [((x + 1, y + 2, x + 41, y + 42), 15 if (row, col) == (1, 2) else 10)
+                for row in range(3) for col in range(5)
+                for x, y in [(44 + col * 48, 18 + row * 48)]]
+
+# Deselecting the selected icon of an already rendered bottom screen
+BOTTOM_SCENE = theme.bottom_scene()
+BOTTOM_SCENE.render()
+DESELECTED = theme.icon_layer(7, 140, 66, False)
+
+# (name, current, reference, args)
+CASES = [
+    ("top gradient", theme.create_vertical_gradient, reference_vertical_gradient,
+     (412, 240, (255, 255, 255, 255), (242, 242, 245, 255))),
+    ("bottom gradient", theme.create_vertical_gradient, reference_vertical_gradient,
+     (320, 240, (253, 253, 255, 255), (244, 244, 247, 255))),
+    ("top dots", theme.create_dotted_texture, reference_dotted_texture,
+     (412, 240, 10, 4)),
+    ("bottom dots", theme.create_dotted_texture, reference_dotted_texture,
+     (320, 240, 12, 3)),
+    ("top glow", theme.soft_glow, reference_soft_glow, TOP_GLOW),
+    ("top glow reduce 4", partial(theme.soft_glow, reduce=4),
+     reference_soft_glow, TOP_GLOW),
+    ("small glow", theme.soft_glow, reference_soft_glow, SMALL_GLOW),
+    ("small glow reduce 4", partial(theme.soft_glow, reduce=4),
+     reference_soft_glow, SMALL_GLOW),
+    ("icon shadows", theme.drop_shadows, reference_drop_shadows,
+     (BOTTOM_BASE, ICON_SHADOWS, 7, 2)),
+    ("icon edit", icon_edit, reference_icon_edit, (BOTTOM_SCENE, DESELECTED)),
+    # rendering every time against the sprite cache
+    ("logo", theme.logo_sprite, theme.render_iisu_logo, (1.2,)),
+    ("glyphs", partial(glyph_sheet, theme.glyph_sprite),
+     partial(glyph_sheet, theme.render_glyph), ()),
+]
+
+
+def best_time(fn, args, repeat):
+    """The fastest of repeat calls, in seconds, and the last result."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def max_difference(a, b):
+    """The largest per-channel difference between two images."""
+    if a.mode != b.mode or a.size != b.size:
+        raise ValueError(f"{a.mode} {a.size} and {b.mode} {b.size} differ")
+    return max(high for _, high in ImageChops.difference(a, b).getextrema())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--case", action="append",
+                        choices=[name for name, *_ in CASES],
+                        help="case to run (repeatable; default all)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("-o", "--output", help="write the JSON here")
+    args = parser.parse_args()
+
+    results = []
+    for name, current, reference, call_args in CASES:
+        if args.case and name not in args.case:
+            continue
+        before, expected = best_time(reference, call_args, args.repeat)
+        after, actual = best_time(current, call_args, args.repeat)
+        results.append({
+            "case": name,
+            "before_ms": round(1000 * before, 3),
+            "after_ms": round(1000 * after, 3),
+            "speedup": round(before / after, 1),
+            "max_difference": max_difference(expected, actual),
+        })
+        print(f"  {name:20s} {1000*before:>9.2f} ms -> {1000*after:>8.2f} ms "
+              f"({before/after:>6.1f}x, max diff {results[-1]['max_difference']})",
+              file=sys.stderr)
+
+    text = json.dumps({"repeat": args.repeat, "results": results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Render the screens of a body_LZ.bin as PNGs, as the 3DS will show them.
+Decompresses the body, reads the top and bottom texture offsets from the
+header at 0x18 and 0x28, un-swizzles the tiled textures and expands RGB565
+to RGB888 the way the GPU does, by repeating the top bits of each channel.
+"""
+
+import argparse
+import os
+import struct
+import sys
+from array import array
+from PIL import Image
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'backend'))
+from lz11 import decompress_nlz11
+from swizzle import unswizzle
+
+try:
+    import numpy as np
+except ImportError:  # a lookup table is used instead
+    np = None
+
+OUTPUT_DIR = os.path.join(ROOT_DIR, "iiSU_White_UI")
+
+TEX_W, TEX_H = 512, 256
+
+# The header offset of each screen's texture offset, and the part of the
+# texture the screen shows (the same size as top.png and bottom.png)
+SCREENS = {
+    "top": (0x18, (412, 240)),
+    "bottom": (0x28, (320, 240)),
+}
+
+
+def _expand(v):
+    r, g, b = v >> 11, (v >> 5) & 0x3F, v & 0x1F
+    return bytes(((r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)))
+
+
+_rgb888 = None
+
+
+def rgb565_to_rgb888(data):
+    """Expand little-endian RGB565 pixels to RGB888 bytes."""
+    global _rgb888
+    if np is not None:
+        v = np.frombuffer(data, dtype='<u2')
+        r = (v >> 11).astype(np.uint8)
+        g = ((v >> 5) & 0x3F).astype(np.uint8)
+        b = (v & 0x1F).astype(np.uint8)
+        rgb = np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4),
+                        (b << 3) | (b >> 2)], axis=-1)
+        return rgb.tobytes()
+
+    if _rgb888 is None:
+        _rgb888 = [_expand(v) for v in range(0x10000)]
+    pixels = array('H', bytes(data))
+    if sys.byteorder == 'big':
+        pixels.byteswap()
+    return b''.join(map(_rgb888.__getitem__, pixels))
+
+
+def decode_texture(body, offset, tex_w=TEX_W, tex_h=TEX_H, fmt='rgb565'):
+    """Decode the tiled texture at offset in the decompressed body into a
+    tex_w x tex_h RGB image. fmt is 'rgb565', 'etc1' or 'etc1a4'; the
+    header does not say, so it must match how the body was built."""
+    if fmt == 'rgb565':
+        tiled = body[offset:offset + tex_w * tex_h * 2]
+        linear = unswizzle(tiled, tex_w, tex_h, 2)
+        return Image.frombytes('RGB', (tex_w, tex_h), rgb565_to_rgb888(linear))
+
+    from etc1 import decode_etc1
+    alpha = fmt == 'etc1a4'
+    size = tex_w * tex_h // (1 if alpha else 2)
+    pixels = decode_etc1(body[offset:offset + size], tex_w, tex_h, alpha)
+    return Image.fromarray(pixels[..., :3])
+
+
+def body_previews(body_lz, top_format='rgb565', bottom_format='rgb565'):
+    """Return {screen name: image} for the screens of a compressed body."""
+    body = bytes(decompress_nlz11(body_lz))
+    formats = {"top": top_format, "bottom": bottom_format}
+    previews = {}
+    for name, (header_offset, size) in SCREENS.items():
+        offset, = struct.unpack_from('<I', body, header_offset)
+        texture = decode_texture(body, offset, fmt=formats[name])
+        previews[name] = texture.crop((0, 0) + size)
+    return previews
+
+
+def write_previews(body_lz, directory, top_format='rgb565',
+                   bottom_format='rgb565'):
+    """Write device_top.png and device_bottom.png to directory and return
+    their paths."""
+    paths = []
+    for name, img in body_previews(body_lz, top_format, bottom_format).items():
+        path = os.path.join(directory, f"device_{name}.png")
+        img.save(path)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("body", nargs="?",
+                        default=os.path.join(OUTPUT_DIR, "body_LZ.bin"))
+    parser.add_argument("-o", "--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--top-format", default="rgb565",
+                        choices=("rgb565", "etc1", "etc1a4"))
+    parser.add_argument("--bottom-format", default="rgb565",
+                        choices=("rgb565", "etc1", "etc1a4"))
+    args = parser.parse_args()
+
+    with open(args.body, 'rb') as f:
+        body_lz = f.read()
+    for path in write_previews(body_lz, args.output_dir, args.top_format,
+                               args.bottom_format):
+        print(f"  Saved: {path}")
+
+
+if __name__ == "__main__":
+    main()
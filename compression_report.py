@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Compare the LZ11 compression levels on the real theme body.
+Builds the body from iiSU_White_UI/top.png and bottom.png the same way
+generate_real_binaries does, compresses it at every level and prints the
+compressed size, ratio and time of each, serially and in parallel mode.
+Then shows how much ordered dithering grows each screen's compressed
+texture.
+"""
+
+import io
+import os
+import time
+from PIL import Image
+
+from generate_real_binaries import (OUTPUT_DIR, build_body_data,
+                                    image_to_tiled_rgb565)
+from lz11 import (compress_nlz11, decompress_nlz11, NLZ11HashWindow,
+                  GREEDY, LAZY, OPTIMAL, SEGMENT_SIZE)
+
+LEVELS = [
+    ("greedy", GREEDY),
+    ("lazy", LAZY),
+    ("optimal", OPTIMAL),
+]
+
+
+def compress_level(body_data, level, processes=None):
+    """Compress body_data at level; returns (compressed bytes, seconds)."""
+    out_buf = io.BytesIO()
+    start = time.perf_counter()
+    compress_nlz11(body_data, out_buf, windowclass=NLZ11HashWindow, level=level,
+                   processes=processes)
+    elapsed = time.perf_counter() - start
+    compressed = out_buf.getvalue()
+    if decompress_nlz11(compressed) != body_data:
+        raise RuntimeError(f"level {level} does not decompress to the body data")
+    return compressed, elapsed
+
+
+def dither_report(images):
+    """Print the GREEDY compressed size of each screen's texture, truncated
+    and dithered."""
+    print(f"  {'texture':8s} {'truncated':>10s} {'dithered':>10s} {'growth':>8s}")
+    for name, img in images:
+        sizes = []
+        for dither in (False, True):
+            texture = image_to_tiled_rgb565(img, 512, 256, dither=dither)
+            sizes.append(len(compress_level(texture, GREEDY)[0]))
+        print(f"  {name:8s} {sizes[0]:>10,} {sizes[1]:>10,} "
+              f"{100*(sizes[1] - sizes[0])/sizes[0]:>+7.1f}%")
+
+
+def main():
+    top_path = os.path.join(OUTPUT_DIR, "top.png")
+    bot_path = os.path.join(OUTPUT_DIR, "bottom.png")
+
+    if not os.path.exists(top_path) or not os.path.exists(bot_path):
+        print("ERROR: Run generate_theme.py first to create top.png and bottom.png")
+        return
+
+    top_img = Image.open(top_path)
+    bot_img = Image.open(bot_path)
+    body_data = build_body_data(top_img, bot_img)
+    print(f"  Decompressed body: {len(body_data):,} bytes")
+    print()
+    print(f"  {'level':8s} {'bytes':>10s} {'ratio':>7s} {'vs greedy':>10s} {'time':>9s}"
+          f" {'parallel':>10s} {'loss':>7s} {'time':>9s}")
+
+    base = None
+    for name, level in LEVELS:
+        compressed, elapsed = compress_level(body_data, level)
+        parallel, parallel_elapsed = compress_level(body_data, level, processes=0)
+        if base is None:
+            base = len(compressed)
+        print(f"  {name:8s} {len(compressed):>10,} "
+              f"{100*len(compressed)/len(body_data):>6.2f}% "
+              f"{100*(len(compressed) - base)/base:>+9.2f}% "
+              f"{elapsed:>8.2f}s "
+              f"{len(parallel):>10,} "
+              f"{100*(len(parallel) - len(compressed))/len(compressed):>+6.2f}% "
+              f"{parallel_elapsed:>8.2f}s")
+    print()
+    print(f"  parallel: {os.cpu_count()} processes, "
+          f"{SEGMENT_SIZE // 1024} KB segments")
+    print()
+    dither_report([("top", top_img), ("bottom", bot_img)])
+
+
+if __name__ == "__main__":
+    main()
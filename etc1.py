@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+ETC1 and ETC1A4 texture encoding for the 3DS.
+ETC1 stores each 4x4 block of pixels in 8 bytes, 4 bits per pixel; ETC1A4
+prefixes every block with 8 bytes of 4-bit alpha. The 3DS keeps the blocks
+in the same 8x8 tiles as its other formats, four blocks to a tile in Z
+order, and stores every 64-bit word little-endian.
+
+Blocks are encoded in batches with NumPy: every candidate base color and
+modifier table of a batch is tried at once. The fast mode tries only the
+quantized average color of each sub-block; the quality mode also tries
+the colors a step lighter and darker, and then the same around the base
+color that best fits the modifiers of its first choice.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from swizzle import swizzle, unswizzle, tile_offset
+
+# The number of blocks encoded in one batch, and in one job on a worker
+BATCH_BLOCKS = 256
+
+# The ETC1 modifier tables; a pixel index selects one of the four columns
+MODIFIERS = np.array([
+    [2, 8, -2, -8],
+    [5, 17, -5, -17],
+    [9, 29, -9, -29],
+    [13, 42, -13, -42],
+    [18, 60, -18, -60],
+    [24, 80, -24, -80],
+    [33, 106, -33, -106],
+    [47, 183, -47, -183],
+], dtype=np.int32)
+
+# ETC1 numbers the pixels of a block column by column, j = x * 4 + y. The
+# swizzled texture has them in Morton order; this picks them out in ETC1
+# order.
+ETC_FROM_MORTON = np.array([tile_offset(j // 4, j % 4) for j in range(16)])
+
+# The pixels of the two sub-blocks, by flip bit: side by side 2x4 halves,
+# or stacked 4x2 halves
+SUBBLOCKS = (
+    (np.arange(0, 8), np.arange(8, 16)),
+    (np.array([0, 1, 4, 5, 8, 9, 12, 13]), np.array([2, 3, 6, 7, 10, 11, 14, 15])),
+)
+
+# The error of a candidate that cannot be encoded; two of them still add up
+# without overflowing
+INVALID = 1 << 62
+
+# Base color offsets tried around the quantized average, in quantized
+# steps. The quality mode tries them along the gray axis, then again around
+# the base color that best fits the modifiers chosen by the first try.
+FAST_OFFSETS = np.zeros((1, 3), dtype=np.int32)
+QUALITY_OFFSETS = np.array([(-1, -1, -1), (0, 0, 0), (1, 1, 1)], dtype=np.int32)
+
+
+def _expand4(c):
+    return c * 17
+
+
+def _expand5(c):
+    return (c << 3) | (c >> 2)
+
+
+def _fit(pixels, bases, valid=None):
+    """Find the best base color and modifier table for a batch of
+    sub-blocks.
+
+    pixels is (N, 8, 3) and bases (N, K, 3) holds K candidate base colors,
+    expanded to 8 bits, for each sub-block. valid (N, K) masks out
+    candidates that cannot be encoded. Returns the squared error, the
+    candidate and table chosen, and the modifier index of each pixel.
+    """
+    n, k = bases.shape[:2]
+    colors = bases[:, :, None, None, :] + MODIFIERS[None, None, :, :, None]
+    np.clip(colors, 0, 255, out=colors)
+    diff = pixels[:, None, None, None, :, :] - colors[:, :, :, :, None, :]
+    err = (diff * diff).sum(-1)                      # (N, K, table, mod, pixel)
+    index = err.argmin(3)                            # (N, K, table, pixel)
+    total = err.min(3).sum(-1).reshape(n, k * 8).astype(np.int64)
+    if valid is not None:
+        total[~np.repeat(valid, 8, axis=1)] = INVALID
+    choice = total.argmin(1)
+    rows = np.arange(n)
+    candidate, table = np.divmod(choice, 8)
+    return (total[rows, choice], candidate, table,
+            index[rows, candidate, table])
+
+
+def _fit_half(half, center, offsets, differential, base0=None):
+    """Fit the sub-blocks half (N, 8, 3) with the candidate base colors
+    around center, a color in 0-255. In differential mode the second half
+    passes base0, the quantized first color, that its own must be within
+    reach of. Returns the _fit() result and the quantized base colors."""
+    levels = 31 if differential else 15
+    expand = _expand5 if differential else _expand4
+    quantized = np.rint(center * levels / 255).astype(np.int32)
+    candidates = np.clip(quantized[:, None, :] + offsets[None], 0, levels)
+    valid = None
+    if base0 is not None:
+        delta = candidates - base0[:, None, :]
+        valid = ((-4 <= delta) & (delta <= 3)).all(-1)
+    fit = _fit(half, expand(candidates), valid)
+    return fit, candidates[np.arange(len(half)), fit[1]]
+
+
+def _encode_mode(blocks, flip, differential, quality):
+    """Encode a batch of (N, 16, 3) blocks with one flip and mode. Returns
+    the squared error and the 64-bit blocks."""
+    n = len(blocks)
+    offsets = QUALITY_OFFSETS if quality else FAST_OFFSETS
+
+    base = []
+    fits = []
+    for half in (blocks[:, s] for s in SUBBLOCKS[flip]):
+        base0 = base[0] if differential and base else None
+        fit, color = _fit_half(half, half.mean(1), offsets, differential, base0)
+        if quality:
+            # the least-squares base color for the table and modifiers found
+            modifier = MODIFIERS[fit[2][:, None], fit[3]]
+            center = (half - modifier[..., None]).mean(1)
+            refit, recolor = _fit_half(half, center, offsets, differential,
+                                       base0)
+            better = refit[0] < fit[0]
+            fit = tuple(np.where(better.reshape((-1,) + (1,) * (a.ndim - 1)), b, a)
+                        for a, b in zip(fit, refit))
+            color = np.where(better[:, None], recolor, color)
+        base.append(color)
+        fits.append(fit)
+
+    # in differential mode the second color may not be reachable from the
+    # first at all, which leaves the error at INVALID or more
+    err = fits[0][0] + fits[1][0]
+
+    c0 = base[0].astype(np.uint64)
+    c1 = base[1].astype(np.uint64)
+    if differential:
+        d = (base[1] - base[0]).astype(np.uint64) & np.uint64(7)
+        word = ((c0[:, 0] << np.uint64(59)) | (d[:, 0] << np.uint64(56)) |
+                (c0[:, 1] << np.uint64(51)) | (d[:, 1] << np.uint64(48)) |
+                (c0[:, 2] << np.uint64(43)) | (d[:, 2] << np.uint64(40)))
+    else:
+        word = ((c0[:, 0] << np.uint64(60)) | (c1[:, 0] << np.uint64(56)) |
+                (c0[:, 1] << np.uint64(52)) | (c1[:, 1] << np.uint64(48)) |
+                (c0[:, 2] << np.uint64(44)) | (c1[:, 2] << np.uint64(40)))
+    word |= fits[0][2].astype(np.uint64) << np.uint64(37)
+    word |= fits[1][2].astype(np.uint64) << np.uint64(34)
+    word |= np.uint64(differential << 1 | flip) << np.uint64(32)
+
+    index = np.empty((n, 16), dtype=np.uint64)
+    for s, fit in zip(SUBBLOCKS[flip], fits):
+        index[:, s] = fit[3]
+    shift = np.arange(16, dtype=np.uint64)
+    word |= ((index >> np.uint64(1)) << (shift + np.uint64(16))).sum(1,
+                                                                    dtype=np.uint64)
+    word |= ((index & np.uint64(1)) << shift).sum(1, dtype=np.uint64)
+    return err, word
+
+
+def encode_blocks(blocks, quality=False):
+    """Encode (N, 16, 3) blocks of 8-bit RGB, pixels in ETC1 order, into
+    N 64-bit ETC1 words, trying both flips and both modes for each block."""
+    out = np.empty(len(blocks), dtype=np.uint64)
+    for start in range(0, len(blocks), BATCH_BLOCKS):
+        batch = blocks[start:start + BATCH_BLOCKS].astype(np.int32)
+        best_err = None
+        for flip in (0, 1):
+            for differential in (1, 0):
+                err, word = _encode_mode(batch, flip, differential, quality)
+                if best_err is None:
+                    best_err, best = err, word
+                else:
+                    better = err < best_err
+                    best_err = np.where(better, err, best_err)
+                    best = np.where(better, word, best)
+        out[start:start + len(batch)] = best
+    return out
+
+
+def encode_alpha(alpha):
+    """Pack (N, 16) blocks of 8-bit alpha, pixels in ETC1 order, into N
+    64-bit words of 4-bit alpha."""
+    a4 = (alpha.astype(np.uint64) * np.uint64(15) + np.uint64(127)) // np.uint64(255)
+    shift = np.arange(0, 64, 4, dtype=np.uint64)
+    return (a4 << shift).sum(1, dtype=np.uint64)
+
+
+def _to_blocks(pixels, width, height):
+    """Split a (height, width, channels) array into (N, 16, channels)
+    blocks in 3DS order, pixels in ETC1 order."""
+    channels = pixels.shape[2]
+    tiled = swizzle(pixels.astype(np.uint8).tobytes(), width, height,
+                    channels)
+    blocks = np.frombuffer(tiled, dtype=np.uint8).reshape(-1, 16, channels)
+    return blocks[:, ETC_FROM_MORTON]
+
+
+def _from_blocks(blocks, width, height):
+    """Undo _to_blocks."""
+    channels = blocks.shape[2]
+    morton = np.empty_like(blocks)
+    morton[:, ETC_FROM_MORTON] = blocks
+    linear = unswizzle(morton.tobytes(), width, height, channels)
+    return np.frombuffer(linear, dtype=np.uint8).reshape(height, width, channels)
+
+
+def encode_etc1(pixels, width, height, alpha=False, quality=False,
+                processes=None):
+    """Encode a row-major (height, width, 3) RGB or, with alpha, (height,
+    width, 4) RGBA array as a 3DS ETC1 or ETC1A4 texture.
+
+    processes encodes batches of blocks on that many worker processes (0
+    for one per CPU), like the LZ compressors.
+    """
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    if pixels.shape != (height, width, 4 if alpha else 3):
+        raise ValueError(f"expected a {width}x{height} "
+                         f"{'RGBA' if alpha else 'RGB'} array, got shape "
+                         f"{pixels.shape}")
+    blocks = _to_blocks(pixels, width, height)
+
+    if processes is None:
+        words = encode_blocks(blocks[..., :3], quality)
+    else:
+        batches = [blocks[i:i + BATCH_BLOCKS, :, :3]
+                   for i in range(0, len(blocks), BATCH_BLOCKS)]
+        with ProcessPoolExecutor(processes or None) as executor:
+            words = np.concatenate(list(executor.map(
+                encode_blocks, batches, [quality] * len(batches))))
+
+    if alpha:
+        words = np.stack([encode_alpha(blocks[..., 3]), words], axis=1)
+    return words.astype('<u8').tobytes()
+
+
+def decode_etc1(data, width, height, alpha=False):
+    """Decode a 3DS ETC1 or ETC1A4 texture into a row-major (height, width,
+    3) RGB or (height, width, 4) RGBA array."""
+    words = np.frombuffer(data, dtype='<u8').astype(np.uint64)
+    if alpha:
+        alpha_words, words = words[0::2], words[1::2]
+    if len(words) * 16 != width * height:
+        raise ValueError(f"expected {width * height // 16} blocks for a "
+                         f"{width}x{height} texture, got {len(words)}")
+
+    def bits(shift, count):
+        return ((words >> np.uint64(shift)) & np.uint64((1 << count) - 1)).astype(np.int32)
+
+    differential = bits(33, 1).astype(bool)
+    flip = bits(32, 1).astype(bool)
+    base = np.empty((len(words), 2, 3), dtype=np.int32)
+    for c, (hi, lo) in enumerate(((59, 56), (51, 48), (43, 40))):
+        c0 = bits(hi, 5)
+        delta = bits(lo, 3)
+        delta -= (delta & 4) << 1
+        base[:, 0, c] = np.where(differential, _expand5(c0),
+                                 _expand4(bits(hi + 1, 4)))
+        base[:, 1, c] = np.where(differential, _expand5((c0 + delta) & 31),
+                                 _expand4(bits(lo, 4)))
+    tables = np.stack([bits(37, 3), bits(34, 3)], axis=1)
+
+    j = np.arange(16)
+    index = bits(16, 16)[:, None] >> j & 1
+    index = index << 1 | (bits(0, 16)[:, None] >> j & 1)
+    second = np.where(flip[:, None], j % 4 >= 2, j >= 8).astype(np.intp)
+    rows = np.arange(len(words))[:, None]
+    modifier = MODIFIERS[tables[rows, second], index]
+    rgb = np.clip(base[rows, second] + modifier[..., None], 0, 255)
+
+    if alpha:
+        a4 = (alpha_words[:, None] >> (4 * j).astype(np.uint64)) & np.uint64(15)
+        rgb = np.concatenate([rgb, (a4.astype(np.int32) * 17)[..., None]], axis=2)
+    return _from_blocks(rgb.astype(np.uint8), width, height)
@@ -9,14 +9,64 @@ import struct
 import os
 import io
 import sys
+import hashlib
+import pickle
+from array import array
 from PIL import Image
 
+try:
+    import numpy as np
+except ImportError:  # the per-pixel loop below is used instead
+    np = None
+
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, os.path.join(ROOT_DIR, 'backend'))
-from lz11 import compress_nlz11
+from swizzle import swizzle
+from atomic_file import atomic_write
+from body_preview import write_previews
+from lz11 import (decompress_nlz11, estimate_nlz11_size, get_codec,
+                  IncrementalCompressor, GREEDY, VERSION as LZ_VERSION)
 
 OUTPUT_DIR = os.path.join(ROOT_DIR, "iiSU_White_UI")
 
+# LZ11 settings for body_LZ.bin
+LZ_CODEC = get_codec('lz11-hash')
+LZ_LEVEL = GREEDY
+
+# The largest body_LZ.bin the home menu accepts: the size of the
+# BodyCache.bin extdata file a theme is installed into
+BODY_LZ_MAX_BYTES = 0x150000
+
+# Texture formats for the screens: 16-bit RGB565, or ETC1 at 4 bits per
+# pixel (8 with 4-bit alpha as ETC1A4), which needs numpy
+TEXTURE_FORMATS = ('rgb565', 'etc1', 'etc1a4')
+
+# The format of each screen's texture in body_LZ.bin. The body header has
+# no field for the texture format, so the home menu reads every texture as
+# RGB565 and build_body_data refuses anything else; ETC1 is only for
+# trying out the encoder and previewing it with body_preview.py
+TOP_TEX_FORMAT = 'rgb565'
+BOTTOM_TEX_FORMAT = 'rgb565'
+
+# Whether to ordered-dither each screen's RGB565 texture (needs numpy).
+# Dithering removes banding from soft gradients but adds entropy, so the
+# body compresses worse; compression_report.py shows by how much.
+TOP_TEX_DITHER = False
+BOTTOM_TEX_DITHER = False
+
+# The side of the Bayer matrix used for dithering
+DITHER_SIZE = 8
+
+# ETC1 encoder settings: the slower quality mode, and the worker processes
+# to encode on (None to encode in this process, 0 for one per CPU)
+ETC1_QUALITY = True
+ETC1_PROCESSES = None
+
+# Compressed bodies and the incremental compressor state are cached here,
+# up to CACHE_MAX_BYTES in total
+CACHE_DIR = os.path.join(ROOT_DIR, ".lz_cache")
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
 # Theme accent colors (RGB888)
 CURSOR_BORDER   = (124, 140, 255)  # #7C8CFF
 CURSOR_MAIN     = (159, 170, 255)  # #9FAAFF
@@ -32,48 +82,90 @@ def rgb565(r, g, b):
     return ((r >> 3) << 11) | ((g >> 2) << 5) | (b >> 3)
 
 
-def tile_offset(x, y):
-    """Get Morton/Z-order index for pixel (x,y) within an 8x8 tile."""
-    return (
-        (x & 1) |
-        ((y & 1) << 1) |
-        ((x & 2) << 1) |
-        ((y & 2) << 2) |
-        ((x & 4) << 2) |
-        ((y & 4) << 3)
-    )
+def pad_image(img, tex_w, tex_h, mode='RGB'):
+    """Crop img, or pad it with the theme base color, to tex_w x tex_h."""
+    fill = (248, 248, 248, 255)[:len(mode)]
+    canvas = Image.new(mode, (tex_w, tex_h), fill)
+    canvas.paste(img.convert(mode), (0, 0))
+    return canvas
+
+
+def bayer_matrix(n):
+    """The n x n Bayer threshold matrix (n a power of two), scaled to
+    thresholds evenly spread over (0, 1)."""
+    m = np.zeros((1, 1))
+    while len(m) < n:
+        m = np.block([[4 * m, 4 * m + 2], [4 * m + 3, 4 * m + 1]])
+    return (m + 0.5) / m.size
+
+
+def dither_rgb565(rgb):
+    """Quantize a (height, width, 3) RGB888 array to RGB565 with 8x8 Bayer
+    ordered dithering instead of truncation; returns the uint16 pixels.
+    The GPU expands a level L back to 8 bits by bit replication, so a
+    channel is placed between the two levels whose expanded values enclose
+    it and rounded up for the share of the pixels in each 8x8 tile that
+    its distance from the lower one calls for. A flat area then averages
+    to its own colour and gradients lose their bands."""
+    height, width = rgb.shape[:2]
+    threshold = np.tile(bayer_matrix(DITHER_SIZE),
+                        (-(-height // DITHER_SIZE), -(-width // DITHER_SIZE)))
+    threshold = threshold[:height, :width]
+    q = []
+    for c, bits in enumerate((5, 6, 5)):
+        levels = np.arange(1 << bits)
+        expanded = (levels << (8 - bits)) | (levels >> (2 * bits - 8))
+        # the fractional level of each 8-bit value
+        position = np.interp(np.arange(256), expanded, levels)
+        q.append(np.floor(position[rgb[..., c]] + threshold)
+                 .clip(0, levels[-1]).astype(np.uint16))
+    return (q[0] << 11) | (q[1] << 5) | q[2]
+
+
+def image_to_rgb565(img, tex_w, tex_h, dither=False):
+    """Convert PIL Image to row-major little-endian RGB565, cropped or
+    padded with the theme base color to tex_w x tex_h. dither uses
+    dither_rgb565 instead of truncating, and needs numpy."""
+    canvas = pad_image(img, tex_w, tex_h)
+    if dither:
+        if np is None:
+            raise ImportError("dithering needs numpy")
+        return dither_rgb565(np.asarray(canvas)).astype('<u2').tobytes()
+    if np is not None:
+        rgb = np.asarray(canvas).astype(np.uint16)
+        val = ((rgb[..., 0] >> 3) << 11) | ((rgb[..., 1] >> 2) << 5) | (rgb[..., 2] >> 3)
+        return val.astype('<u2').tobytes()
+
+    rgb = canvas.tobytes()
+    val = array('H', map(rgb565, rgb[0::3], rgb[1::3], rgb[2::3]))
+    if sys.byteorder == 'big':
+        val.byteswap()
+    return val.tobytes()
+
+
+def image_to_tiled_rgb565(img, tex_w, tex_h, dither=False):
+    """Convert PIL Image to tiled RGB565 for 3DS texture format."""
+    return swizzle(image_to_rgb565(img, tex_w, tex_h, dither), tex_w, tex_h, 2)
 
 
-def image_to_tiled_rgb565(img, tex_w, tex_h):
-    """Convert PIL Image to tiled RGB565 for 3DS texture format."""
-    buf = bytearray(tex_w * tex_h * 2)
-    img_w, img_h = img.size
-    img_rgb = img.convert('RGB')
-    pixels = img_rgb.load()
-
-    tiles_x = tex_w // 8
-    tiles_y = tex_h // 8
-
-    for ty in range(tiles_y):
-        for tx in range(tiles_x):
-            tile_idx = ty * tiles_x + tx
-            for py in range(8):
-                for px in range(8):
-                    ix = tx * 8 + px
-                    iy = ty * 8 + py
-                    if ix < img_w and iy < img_h:
-                        r, g, b = pixels[ix, iy]
-                    else:
-                        r, g, b = 248, 248, 248  # Fill with theme base color
-                    val = rgb565(r, g, b)
-                    morton = tile_offset(px, py)
-                    offset = (tile_idx * 64 + morton) * 2
-                    struct.pack_into('<H', buf, offset, val)
-
-    return bytes(buf)
-
-
-def build_body_data(top_img, bottom_img):
+def image_to_texture(img, tex_w, tex_h, fmt, dither=False):
+    """Convert PIL Image to a tiled 3DS texture in fmt, one of
+    TEXTURE_FORMATS. dither applies to RGB565 only."""
+    if fmt not in TEXTURE_FORMATS:
+        raise ValueError(f"unknown texture format {fmt!r}")
+    if fmt == 'rgb565':
+        return image_to_tiled_rgb565(img, tex_w, tex_h, dither)
+
+    from etc1 import encode_etc1
+    alpha = fmt == 'etc1a4'
+    pixels = np.asarray(pad_image(img, tex_w, tex_h, 'RGBA' if alpha else 'RGB'))
+    return encode_etc1(pixels, tex_w, tex_h, alpha=alpha,
+                       quality=ETC1_QUALITY, processes=ETC1_PROCESSES)
+
+
+def build_body_data(top_img, bottom_img, top_format='rgb565',
+                    bottom_format='rgb565', top_dither=False,
+                    bottom_dither=False):
     """
     Build the decompressed body data according to 3dbrew spec.
 
@@ -83,16 +175,26 @@ def build_body_data(top_img, bottom_img):
 
     Top screen: draw type 3 (texture), frame type 1 (texture0, no scroll)
     Bottom screen: draw type 3 (texture), frame type 1 (texture2, no scroll)
+
+    The header has no field for the texture format and the home menu
+    reads both textures as RGB565, so top_format and bottom_format must be
+    'rgb565'; anything else raises ValueError. A texture with dither set
+    is ordered-dithered (see dither_rgb565).
     """
+    for screen, fmt in (("top", top_format), ("bottom", bottom_format)):
+        if fmt != 'rgb565':
+            raise ValueError(f"the {screen} screen texture is {fmt!r}, but "
+                             "the body can only hold RGB565 textures")
+
     # Texture sizes: 512x256 for both texture0 and texture2
     TEX_W, TEX_H = 512, 256
-    tex_size = TEX_W * TEX_H * 2  # RGB565 = 2 bytes per pixel
 
-    # Convert images to tiled RGB565
-    print("    Converting top screen to tiled RGB565 (512x256)...")
-    top_tex = image_to_tiled_rgb565(top_img, TEX_W, TEX_H)
-    print("    Converting bottom screen to tiled RGB565 (512x256)...")
-    bot_tex = image_to_tiled_rgb565(bottom_img, TEX_W, TEX_H)
+    # Convert images to tiled textures
+    print(f"    Converting top screen to tiled {top_format.upper()} (512x256)...")
+    top_tex = image_to_texture(top_img, TEX_W, TEX_H, top_format, top_dither)
+    print(f"    Converting bottom screen to tiled {bottom_format.upper()} (512x256)...")
+    bot_tex = image_to_texture(bottom_img, TEX_W, TEX_H, bottom_format,
+                               bottom_dither)
 
     # Layout data blocks after header (padded to 0xD0)
     header_size = 0xD0
@@ -101,9 +203,9 @@ def build_body_data(top_img, bottom_img):
     cursor_color_offset = header_size        # 0xD0, 12 bytes
     folder_color_offset = cursor_color_offset + 0x10  # 0xE0, 12 bytes
     top_tex_offset = folder_color_offset + 0x10       # 0xF0
-    bot_tex_offset = top_tex_offset + tex_size         # 0xF0 + 262144
+    bot_tex_offset = top_tex_offset + len(top_tex)     # 0xF0 + 262144 for RGB565
 
-    total_size = bot_tex_offset + tex_size
+    total_size = bot_tex_offset + len(bot_tex)
     # Align to 16 bytes
     total_size = (total_size + 0xF) & ~0xF
 
@@ -175,23 +277,129 @@ def build_body_data(top_img, bottom_img):
     body[off:off+3] = bytes(FOLDER_MAIN)
 
     # === Texture data ===
-    body[top_tex_offset:top_tex_offset + tex_size] = top_tex
-    body[bot_tex_offset:bot_tex_offset + tex_size] = bot_tex
+    body[top_tex_offset:top_tex_offset + len(top_tex)] = top_tex
+    body[bot_tex_offset:bot_tex_offset + len(bot_tex)] = bot_tex
 
     return bytes(body)
 
 
-def generate_body_lz(top_img, bottom_img):
+class LZCache:
+    """On-disk cache of compressed bodies.
+
+    Entries are keyed by a hash of the decompressed data plus the compressor
+    version and settings. Hits refresh an entry's mtime, and the least
+    recently used entries are evicted once the cache is over max_bytes.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, data, codec, level):
+        digest = hashlib.sha256(data).hexdigest()
+        return f"{digest}-{codec.name}-v{LZ_VERSION}-l{level}.lz"
+
+    def get(self, key):
+        """Return the cached bytes for key, or None."""
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return data
+
+    def put(self, key, data):
+        with atomic_write(os.path.join(self.directory, key)) as f:
+            f.write(data)
+        self.evict()
+
+    def compressor_path(self, codec):
+        return os.path.join(self.directory,
+                            f"incremental-{codec.name}-v{LZ_VERSION}.pickle")
+
+    def load_compressor(self, codec):
+        """Return the IncrementalCompressor saved by the last build, or a
+        new one."""
+        try:
+            with open(self.compressor_path(codec), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return IncrementalCompressor(codec.name)
+
+    def save_compressor(self, codec, compressor):
+        with atomic_write(self.compressor_path(codec)) as f:
+            pickle.dump(compressor, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits.
+        The saved IncrementalCompressors count towards max_bytes too."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith((".lz", ".pickle")):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+
+def generate_body_lz(top_img, bottom_img, cache=None):
     """Generate the real body_LZ.bin file."""
     print("  Building body data structure...")
-    body_data = build_body_data(top_img, bottom_img)
+    body_data = build_body_data(top_img, bottom_img, TOP_TEX_FORMAT,
+                                BOTTOM_TEX_FORMAT, TOP_TEX_DITHER,
+                                BOTTOM_TEX_DITHER)
     print(f"    Decompressed body: {len(body_data):,} bytes")
 
-    print("  LZ11 compressing (this may take a moment)...")
-    out_buf = io.BytesIO()
-    compress_nlz11(body_data, out_buf)
-    compressed = out_buf.getvalue()
+    compressed = None
+    if cache is not None:
+        key = cache.key(body_data, LZ_CODEC, LZ_LEVEL)
+        compressed = cache.get(key)
+    if compressed is None:
+        size, error = estimate_nlz11_size(body_data)
+        print(f"    Estimated compressed size: {size:,} +- {error:,} bytes")
+        if BODY_LZ_MAX_BYTES < size - error:
+            raise RuntimeError(
+                f"body_LZ.bin would be about {size:,} bytes, over the "
+                f"{BODY_LZ_MAX_BYTES:,} byte limit")
+
+    if compressed is not None:
+        print("  LZ11 compressed body found in cache")
+    elif cache is not None and LZ_LEVEL == GREEDY:
+        # only the part of the body after the first change since the last
+        # build is compressed again
+        print("  LZ11 compressing incrementally...")
+        compressor = cache.load_compressor(LZ_CODEC)
+        compressed = compressor.compress(body_data)
+        print(f"    Reused the previous build up to byte {compressor.reused:,}")
+        cache.save_compressor(LZ_CODEC, compressor)
+        cache.put(key, compressed)
+    else:
+        print("  LZ11 compressing (this may take a moment)...")
+        out_buf = io.BytesIO()
+        LZ_CODEC.compress(body_data, out_buf, level=LZ_LEVEL)
+        compressed = out_buf.getvalue()
+        if cache is not None:
+            cache.put(key, compressed)
     print(f"    Compressed: {len(compressed):,} bytes ({100*len(compressed)/len(body_data):.1f}%)")
+    if BODY_LZ_MAX_BYTES < len(compressed):
+        raise RuntimeError(f"body_LZ.bin is {len(compressed):,} bytes, over the "
+                           f"{BODY_LZ_MAX_BYTES:,} byte limit")
+    if decompress_nlz11(compressed) != body_data:
+        raise RuntimeError("body_LZ.bin does not decompress to the body data")
+    print("    Verified: decompresses to the body data")
 
     filepath = os.path.join(OUTPUT_DIR, "body_LZ.bin")
     with open(filepath, 'wb') as f:
@@ -237,26 +445,7 @@ def create_icon(size, scale=1):
 
 def image_to_tiled_rgb565_icon(img, size):
     """Convert icon to tiled RGB565 for SMDH (same tiling as textures)."""
-    buf = bytearray(size * size * 2)
-    img_rgb = img.convert('RGB')
-    pixels = img_rgb.load()
-
-    tiles = size // 8
-
-    for ty in range(tiles):
-        for tx in range(tiles):
-            tile_idx = ty * tiles + tx
-            for py in range(8):
-                for px in range(8):
-                    ix = tx * 8 + px
-                    iy = ty * 8 + py
-                    r, g, b = pixels[ix, iy]
-                    val = rgb565(r, g, b)
-                    morton = tile_offset(px, py)
-                    offset = (tile_idx * 64 + morton) * 2
-                    struct.pack_into('<H', buf, offset, val)
-
-    return bytes(buf)
+    return image_to_tiled_rgb565(img, size, size)
 
 
 def generate_info_smdh():
@@ -334,7 +523,13 @@ def main():
 
     print()
     print("[1/2] Generating body_LZ.bin...")
-    generate_body_lz(top_img, bot_img)
+    cache = LZCache()
+    body_lz = generate_body_lz(top_img, bot_img, cache=cache)
+    print(f"    Cache: {cache.hits} hit(s), {cache.misses} miss(es) in {cache.directory}")
+    print("  Rendering the screens as the 3DS shows them...")
+    for path in write_previews(body_lz, OUTPUT_DIR, TOP_TEX_FORMAT,
+                               BOTTOM_TEX_FORMAT):
+        print(f"    Saved: {path}")
 
     print()
     print("[2/2] Generating info.smdh...")
@@ -10,6 +10,9 @@ import struct
 import math
 import os
 
+from scene import Scene, SpriteLayer, DrawLayer
+from sprites import SpriteCache
+
 OUTPUT_DIR = "/app/iiSU_White_UI"
 
 # === Color Palette ===
@@ -26,53 +29,139 @@ TEXT_DARK = (51, 51, 51)
 TEXT_MID = (120, 120, 130)
 TEXT_LIGHT = (180, 180, 185)
 
+# Rendered logo and icon glyph sprites are kept in memory; set this to a
+# directory to keep them between runs as well
+SPRITE_CACHE_DIR = None
+SPRITES = SpriteCache(directory=SPRITE_CACHE_DIR)
+
 
 def create_vertical_gradient(width, height, top_color, bottom_color):
     """Create smooth vertical gradient."""
-    img = Image.new('RGBA', (width, height))
-    pixels = img.load()
+    # one column, then stretched sideways: every row is a single color
+    column = Image.new('RGBA', (1, height))
+    rows = []
     for y in range(height):
         t = y / max(height - 1, 1)
         r = int(top_color[0] + (bottom_color[0] - top_color[0]) * t)
         g = int(top_color[1] + (bottom_color[1] - top_color[1]) * t)
         b = int(top_color[2] + (bottom_color[2] - top_color[2]) * t)
-        for x in range(width):
-            pixels[x, y] = (r, g, b, 255)
-    return img
+        rows.append((r, g, b, 255))
+    column.putdata(rows)
+    return column.resize((width, height), Image.NEAREST)
 
 
 def create_dotted_texture(width, height, spacing=10, dot_alpha=5):
     """Create ultra-subtle staggered dot pattern."""
+    # The pattern repeats every spacing across and every two rows of dots
+    # down, so stamp one tile and double the stamped area until it covers
+    # the texture.
+    tile_w, tile_h = spacing, 2 * spacing
+    tile = Image.new('RGBA', (tile_w, tile_h), (0, 0, 0, 0))
+    tile.putpixel((0, 0), (0, 0, 0, dot_alpha))
+    tile.putpixel((spacing // 2, spacing), (0, 0, 0, dot_alpha))
+
     texture = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-    pixels = texture.load()
-    for y in range(0, height, spacing):
-        offset = (spacing // 2) if (y // spacing) % 2 else 0
-        for x in range(offset, width, spacing):
-            if 0 <= x < width and 0 <= y < height:
-                pixels[x, y] = (0, 0, 0, dot_alpha)
+    texture.paste(tile, (0, 0))
+    w = tile_w
+    while w < width:
+        texture.paste(texture.crop((0, 0, w, tile_h)), (w, 0))
+        w *= 2
+    h = tile_h
+    while h < height:
+        texture.paste(texture.crop((0, 0, width, h)), (0, h))
+        h *= 2
     return texture
 
 
-def soft_glow(img, cx, cy, rx, ry, color, intensity=12, blur=20):
-    """Add a soft elliptical glow."""
-    glow = Image.new('RGBA', img.size, (0, 0, 0, 0))
+def render_glow(size, cx, cy, rx, ry, color, intensity=12, blur=20, reduce=1):
+    """Draw a soft elliptical glow for a canvas of the given size.
+
+    Only the box around the largest ellipse, grown by the reach of the
+    blur (3 sigma), is drawn and blurred. With reduce > 1 that box is
+    blurred at 1/reduce of the resolution and scaled back up, which is
+    faster and looks the same for a wide blur. Returns the (x0, y0) of the
+    box and the glow, or None if it misses the canvas.
+    """
+    width, height = size
+    top_scale = 1 + intensity * 0.08
+    margin = 3 * blur + 3
+    x0 = max(int(cx - rx * top_scale) - margin, 0)
+    y0 = max(int(cy - ry * top_scale) - margin, 0)
+    x1 = min(int(cx + rx * top_scale) + margin + 1, width)
+    y1 = min(int(cy + ry * top_scale) + margin + 1, height)
+    if x1 <= x0 or y1 <= y0:
+        return None
+
+    glow = Image.new('RGBA', (x1 - x0, y1 - y0), (0, 0, 0, 0))
     gd = ImageDraw.Draw(glow)
     for i in range(intensity, 0, -1):
         alpha = int(intensity * (1 - i / intensity))
         scale = 1 + i * 0.08
         gd.ellipse(
-            (int(cx - rx * scale), int(cy - ry * scale),
-             int(cx + rx * scale), int(cy + ry * scale)),
+            (int(cx - rx * scale) - x0, int(cy - ry * scale) - y0,
+             int(cx + rx * scale) - x0, int(cy + ry * scale) - y0),
             fill=(*color[:3], alpha)
         )
-    glow = glow.filter(ImageFilter.GaussianBlur(radius=blur))
-    return Image.alpha_composite(img, glow)
-
-
-def draw_iisu_logo_v2(img, cx, cy, scale=1.0):
+    if reduce > 1:
+        small = glow.reduce(reduce).filter(ImageFilter.GaussianBlur(radius=blur / reduce))
+        glow = small.resize(glow.size, Image.BILINEAR)
+    else:
+        glow = glow.filter(ImageFilter.GaussianBlur(radius=blur))
+    return (x0, y0), glow
+
+
+def soft_glow(img, cx, cy, rx, ry, color, intensity=12, blur=20, reduce=1):
+    """Add a soft elliptical glow (see render_glow)."""
+    out = img.copy()
+    glow = render_glow(img.size, cx, cy, rx, ry, color, intensity, blur, reduce)
+    if glow is not None:
+        origin, layer = glow
+        out.alpha_composite(layer, origin)
+    return out
+
+
+def render_drop_shadows(size, shadows, radius, blur=2):
+    """Draw blurred rounded-rectangle shadows for a canvas of the given size.
+
+    shadows is a list of (box, alpha). They are drawn into one layer
+    covering their joint bounding box plus the reach of the blur, which
+    is blurred once instead of once per shadow. Returns the (x0, y0) of
+    the layer and the layer, or None if it misses the canvas.
+    """
+    width, height = size
+    margin = 3 * blur + 3
+    x0 = max(min(box[0] for box, _ in shadows) - margin, 0)
+    y0 = max(min(box[1] for box, _ in shadows) - margin, 0)
+    x1 = min(max(box[2] for box, _ in shadows) + margin + 1, width)
+    y1 = min(max(box[3] for box, _ in shadows) + margin + 1, height)
+    if x1 <= x0 or y1 <= y0:
+        return None
+
+    layer = Image.new('RGBA', (x1 - x0, y1 - y0), (0, 0, 0, 0))
+    ld = ImageDraw.Draw(layer)
+    for (bx0, by0, bx1, by1), alpha in shadows:
+        ld.rounded_rectangle((bx0 - x0, by0 - y0, bx1 - x0, by1 - y0),
+                             radius=radius, fill=(0, 0, 0, alpha))
+    return (x0, y0), layer.filter(ImageFilter.GaussianBlur(radius=blur))
+
+
+def drop_shadows(img, shadows, radius, blur=2):
+    """Add blurred rounded-rectangle shadows, composited once
+    (see render_drop_shadows)."""
+    out = img.copy()
+    layer = render_drop_shadows(img.size, shadows, radius, blur)
+    if layer is not None:
+        origin, layer = layer
+        out.alpha_composite(layer, origin)
+    return out
+
+
+def render_iisu_logo(scale=1.0, colors=(ACCENT_1, ACCENT_2)):
     """
-    Draw refined iiSU logo using anti-aliased rendering at 4x then downscale.
+    Render the refined iiSU logo anti-aliased: drawn at 4x then downscaled.
+    colors are the main and secondary colours of the letters.
     """
+    main, second = colors
     # Render at 4x for smooth edges
     SS = 4
     logo_w = int(180 * scale)
@@ -113,22 +202,22 @@ def draw_iisu_logo_v2(img, cx, cy, scale=1.0):
     # dot
     dcx = x + stem_w // 2
     dcy = base_y - dot_gap - dot_r
-    d.ellipse((dcx - dot_r, dcy - dot_r, dcx + dot_r, dcy + dot_r), fill=ACCENT_1)
+    d.ellipse((dcx - dot_r, dcy - dot_r, dcx + dot_r, dcy + dot_r), fill=main)
     # stem
-    d.rounded_rectangle((x, base_y, x + stem_w, base_y + stem_h), radius=stem_r, fill=ACCENT_1)
+    d.rounded_rectangle((x, base_y, x + stem_w, base_y + stem_h), radius=stem_r, fill=main)
 
     # === 'i' (second) ===
     x += stem_w + gap
     dcx2 = x + stem_w // 2
-    d.ellipse((dcx2 - dot_r, dcy - dot_r, dcx2 + dot_r, dcy + dot_r), fill=ACCENT_2)
-    d.rounded_rectangle((x, base_y, x + stem_w, base_y + stem_h), radius=stem_r, fill=ACCENT_2)
+    d.ellipse((dcx2 - dot_r, dcy - dot_r, dcx2 + dot_r, dcy + dot_r), fill=second)
+    d.rounded_rectangle((x, base_y, x + stem_w, base_y + stem_h), radius=stem_r, fill=second)
 
     # === 'S' ===
     x += stem_w + gap * 2
 
     # Build S using overlapping rounded rects for smooth curves
     # Outer rounded rect
-    d.rounded_rectangle((x, base_y, x + s_w, base_y + s_h), radius=s_r, fill=ACCENT_1)
+    d.rounded_rectangle((x, base_y, x + s_w, base_y + s_h), radius=s_r, fill=main)
 
     # Cut top-right inner (creates top opening of S)
     inner_r = max(s_r - 4, 2)
@@ -147,28 +236,41 @@ def draw_iisu_logo_v2(img, cx, cy, scale=1.0):
     mid_y = base_y + s_h // 2 - bar_h // 2
 
     # Top bar
-    d.rounded_rectangle((x, base_y, x + s_w, base_y + bar_h), radius=s_r, fill=ACCENT_1)
+    d.rounded_rectangle((x, base_y, x + s_w, base_y + bar_h), radius=s_r, fill=main)
     # Middle bar
-    d.rounded_rectangle((x, mid_y, x + s_w, mid_y + bar_h), radius=s_r, fill=ACCENT_1)
+    d.rounded_rectangle((x, mid_y, x + s_w, mid_y + bar_h), radius=s_r, fill=main)
     # Bottom bar
-    d.rounded_rectangle((x, base_y + s_h - bar_h, x + s_w, base_y + s_h), radius=s_r, fill=ACCENT_1)
+    d.rounded_rectangle((x, base_y + s_h - bar_h, x + s_w, base_y + s_h), radius=s_r, fill=main)
     # Left vertical connector (top to mid)
-    d.rounded_rectangle((x, base_y, x + s_thick, mid_y + bar_h), radius=s_r, fill=ACCENT_1)
+    d.rounded_rectangle((x, base_y, x + s_thick, mid_y + bar_h), radius=s_r, fill=main)
     # Right vertical connector (mid to bottom)
-    d.rounded_rectangle((x + s_w - s_thick, mid_y, x + s_w, base_y + s_h), radius=s_r, fill=ACCENT_1)
+    d.rounded_rectangle((x + s_w - s_thick, mid_y, x + s_w, base_y + s_h), radius=s_r, fill=main)
 
     # === 'U' ===
     x += s_w + gap * 2
 
     # Left vertical
-    d.rounded_rectangle((x, base_y, x + u_thick, base_y + u_h), radius=u_r, fill=ACCENT_2)
+    d.rounded_rectangle((x, base_y, x + u_thick, base_y + u_h), radius=u_r, fill=second)
     # Right vertical
-    d.rounded_rectangle((x + u_w - u_thick, base_y, x + u_w, base_y + u_h), radius=u_r, fill=ACCENT_2)
+    d.rounded_rectangle((x + u_w - u_thick, base_y, x + u_w, base_y + u_h), radius=u_r, fill=second)
     # Bottom connector
-    d.rounded_rectangle((x, base_y + u_h - u_thick, x + u_w, base_y + u_h), radius=u_r, fill=ACCENT_2)
+    d.rounded_rectangle((x, base_y + u_h - u_thick, x + u_w, base_y + u_h), radius=u_r, fill=second)
 
     # Downscale with LANCZOS for anti-aliasing
-    small = buf.resize((buf_w // SS, buf_h // SS), Image.LANCZOS)
+    return buf.resize((buf_w // SS, buf_h // SS), Image.LANCZOS)
+
+
+def logo_sprite(scale=1.0, colors=(ACCENT_1, ACCENT_2)):
+    """The iiSU logo from SPRITES, rendered on first use."""
+    return SPRITES.get('logo', (scale, tuple(colors)),
+                       lambda: render_iisu_logo(scale, colors))
+
+
+def draw_iisu_logo_v2(img, cx, cy, scale=1.0):
+    """
+    Draw refined iiSU logo centred on (cx, cy).
+    """
+    small = logo_sprite(scale)
 
     # Paste onto main image
     paste_x = cx - small.width // 2
@@ -178,60 +280,78 @@ def draw_iisu_logo_v2(img, cx, cy, scale=1.0):
     return img
 
 
-def generate_top_screen():
-    """Generate top.png (412x240) - premium white console top screen."""
+def text_layer(name, xy, text, fill, font):
+    """A scene layer for one line of text drawn at xy."""
+    x, y = xy
+    left, top, right, bottom = font.getbbox(text)
+    key = ('text', xy, text, fill, getattr(font, 'path', None), getattr(font, 'size', None))
+    return DrawLayer(name, (x + left - 1, y + top - 1, x + right + 1, y + bottom + 1),
+                     key, lambda draw: draw.text(xy, text, fill=fill, font=font))
+
+
+def top_scene():
+    """Lay out top.png (412x240) as a scene, bottom layer first."""
     W, H = 412, 240
+    scene = Scene((W, H), WHITE)
 
     # Gradient base
-    img = create_vertical_gradient(W, H, (255, 255, 255, 255), (242, 242, 245, 255))
+    colors = ((255, 255, 255, 255), (242, 242, 245, 255))
+    scene.add(SpriteLayer("gradient", (0, 0), ('gradient', W, H, colors),
+                          create_vertical_gradient(W, H, *colors), mode='replace'))
 
     # Soft center glow
-    img = soft_glow(img, W // 2, H // 2 - 8, 140, 70, ACCENT_3, intensity=15, blur=25)
+    glow = (W // 2, H // 2 - 8, 140, 70, ACCENT_3, 15, 25)
+    origin, image = render_glow((W, H), *glow)
+    scene.add(SpriteLayer("glow", origin, ('glow',) + glow, image))
 
     # Dotted texture
-    tex = create_dotted_texture(W, H, spacing=10, dot_alpha=4)
-    img = Image.alpha_composite(img, tex)
-
-    draw = ImageDraw.Draw(img)
-
-    # Thin decorative lines
-    line_alpha = 25
-    draw.line([(50, 28), (W - 50, 28)], fill=(*ACCENT_3[:3], line_alpha), width=1)
-    draw.line([(50, H - 28), (W - 50, H - 28)], fill=(*ACCENT_3[:3], line_alpha), width=1)
-
-    # Small corner accents
-    corner_size = 12
-    ca = (*ACCENT_3[:3], 20)
-    # Top-left
-    draw.line([(20, 20), (20 + corner_size, 20)], fill=ca, width=1)
-    draw.line([(20, 20), (20, 20 + corner_size)], fill=ca, width=1)
-    # Top-right
-    draw.line([(W - 20, 20), (W - 20 - corner_size, 20)], fill=ca, width=1)
-    draw.line([(W - 20, 20), (W - 20, 20 + corner_size)], fill=ca, width=1)
-    # Bottom-left
-    draw.line([(20, H - 20), (20 + corner_size, H - 20)], fill=ca, width=1)
-    draw.line([(20, H - 20), (20, H - 20 - corner_size)], fill=ca, width=1)
-    # Bottom-right
-    draw.line([(W - 20, H - 20), (W - 20 - corner_size, H - 20)], fill=ca, width=1)
-    draw.line([(W - 20, H - 20), (W - 20, H - 20 - corner_size)], fill=ca, width=1)
-
-    # Subtle floating diamonds
-    diamonds = [(80, 60), (340, 55), (65, 180), (350, 175), (200, 30), (210, 210)]
-    for dx, dy in diamonds:
-        s = 3
-        draw.polygon([(dx, dy - s), (dx + s, dy), (dx, dy + s), (dx - s, dy)],
-                     fill=(*ACCENT_3[:3], 18))
-
-    # Small circles
-    circles = [(100, 100), (320, 140), (55, 130), (360, 100)]
-    for ccx, ccy in circles:
-        cr = 6
-        draw.ellipse((ccx - cr, ccy - cr, ccx + cr, ccy + cr),
-                     outline=(*ACCENT_3[:3], 15), width=1)
-
-    # Draw iiSU logo
-    img = draw_iisu_logo_v2(img, W // 2, H // 2 - 16, scale=1.2)
-    draw = ImageDraw.Draw(img)
+    scene.add(SpriteLayer("texture", (0, 0), ('dots', W, H, 10, 4),
+                          create_dotted_texture(W, H, spacing=10, dot_alpha=4)))
+
+    def decorations(draw):
+        # Thin decorative lines
+        line_alpha = 25
+        draw.line([(50, 28), (W - 50, 28)], fill=(*ACCENT_3[:3], line_alpha), width=1)
+        draw.line([(50, H - 28), (W - 50, H - 28)], fill=(*ACCENT_3[:3], line_alpha), width=1)
+
+        # Small corner accents
+        corner_size = 12
+        ca = (*ACCENT_3[:3], 20)
+        # Top-left
+        draw.line([(20, 20), (20 + corner_size, 20)], fill=ca, width=1)
+        draw.line([(20, 20), (20, 20 + corner_size)], fill=ca, width=1)
+        # Top-right
+        draw.line([(W - 20, 20), (W - 20 - corner_size, 20)], fill=ca, width=1)
+        draw.line([(W - 20, 20), (W - 20, 20 + corner_size)], fill=ca, width=1)
+        # Bottom-left
+        draw.line([(20, H - 20), (20 + corner_size, H - 20)], fill=ca, width=1)
+        draw.line([(20, H - 20), (20, H - 20 - corner_size)], fill=ca, width=1)
+        # Bottom-right
+        draw.line([(W - 20, H - 20), (W - 20 - corner_size, H - 20)], fill=ca, width=1)
+        draw.line([(W - 20, H - 20), (W - 20, H - 20 - corner_size)], fill=ca, width=1)
+
+        # Subtle floating diamonds
+        diamonds = [(80, 60), (340, 55), (65, 180), (350, 175), (200, 30), (210, 210)]
+        for dx, dy in diamonds:
+            s = 3
+            draw.polygon([(dx, dy - s), (dx + s, dy), (dx, dy + s), (dx - s, dy)],
+                         fill=(*ACCENT_3[:3], 18))
+
+        # Small circles
+        circles = [(100, 100), (320, 140), (55, 130), (360, 100)]
+        for ccx, ccy in circles:
+            cr = 6
+            draw.ellipse((ccx - cr, ccy - cr, ccx + cr, ccy + cr),
+                         outline=(*ACCENT_3[:3], 15), width=1)
+
+    scene.add(DrawLayer("decorations", (0, 0, W, H), ('decorations', W, H), decorations))
+
+    # iiSU logo
+    logo_scale = 1.2
+    logo = logo_sprite(logo_scale)
+    cx, cy = W // 2, H // 2 - 16
+    scene.add(SpriteLayer("logo", (cx - logo.width // 2, cy - logo.height // 2),
+                          ('logo', logo_scale), logo, mode='mask'))
 
     # Subtitle
     try:
@@ -241,31 +361,197 @@ def generate_top_screen():
         font_sub = font_tiny = ImageFont.load_default()
 
     subtitle = "W H I T E   U I"
-    bbox = draw.textbbox((0, 0), subtitle, font=font_sub)
+    bbox = font_sub.getbbox(subtitle)
     tw = bbox[2] - bbox[0]
-    draw.text((W // 2 - tw // 2, H // 2 + 42), subtitle, fill=(*TEXT_MID[:3], 110), font=font_sub)
+    scene.add(text_layer("subtitle", (W // 2 - tw // 2, H // 2 + 42), subtitle,
+                         (*TEXT_MID[:3], 110), font_sub))
 
     ver = "v1.0"
-    bbox2 = draw.textbbox((0, 0), ver, font=font_tiny)
+    bbox2 = font_tiny.getbbox(ver)
     tw2 = bbox2[2] - bbox2[0]
-    draw.text((W // 2 - tw2 // 2, H // 2 + 60), ver, fill=(*TEXT_LIGHT[:3], 70), font=font_tiny)
+    scene.add(text_layer("version", (W // 2 - tw2 // 2, H // 2 + 60), ver,
+                         (*TEXT_LIGHT[:3], 70), font_tiny))
+    return scene
 
-    # Finalize
-    final = Image.new('RGB', (W, H), WHITE)
-    final.paste(img, (0, 0), img)
+
+def generate_top_screen():
+    """Generate top.png (412x240) - premium white console top screen."""
+    W, H = 412, 240
+    final = top_scene().render()
     final.save(os.path.join(OUTPUT_DIR, "top.png"), "PNG")
     print(f"  top.png ({W}x{H}) saved")
     return final
 
 
-def generate_bottom_screen():
-    """Generate bottom.png (320x240) - white dashboard bottom screen."""
+def draw_icon(draw, x, y, idx, is_sel, icon_sz=40, icon_r=7):
+    """Draw bottom-screen icon idx with its top-left corner at (x, y)."""
+    if is_sel:
+        # Selection glow
+        for g in range(8, 0, -1):
+            alpha = int(22 * (1 - g / 8))
+            draw.rounded_rectangle(
+                (x - 3 - g, y - 3 - g, x + icon_sz + 3 + g, y + icon_sz + 3 + g),
+                radius=icon_r + g, fill=(*ACCENT_1[:3], alpha)
+            )
+        # Selected border
+        draw.rounded_rectangle(
+            (x - 2, y - 2, x + icon_sz + 2, y + icon_sz + 2),
+            radius=icon_r + 1, outline=ACCENT_1, width=2
+        )
+        fill = (*ACCENT_5[:3], 240)
+    else:
+        fill = (255, 255, 255, 230)
+
+    # Icon body
+    draw.rounded_rectangle(
+        (x, y, x + icon_sz, y + icon_sz),
+        radius=icon_r, fill=fill,
+        outline=(*BASE_2[:3], 160 if not is_sel else 0), width=1
+    )
+
+    # Inner minimal pattern
+    mc = ACCENT_1 if is_sel else ACCENT_3  # Main color for patterns
+    draw.paste(glyph_sprite(idx, mc, fill, icon_sz), (x + GLYPH_INSET, y + GLYPH_INSET))
+
+
+# How far in from an icon's edge its glyph sprite starts; the body fill is
+# even from there on, so the sprite can carry it as its background
+GLYPH_INSET = 4
+
+
+def render_glyph(idx, mc, fill, icon_sz=40):
+    """Render the pattern of bottom-screen icon idx in colour mc on the
+    icon's body fill, covering the icon from GLYPH_INSET in."""
+    size = icon_sz - 2 * GLYPH_INSET + 1
+    tile = Image.new('RGBA', (size, size), fill)
+    draw = ImageDraw.Draw(tile)
+    pad = 9
+    ix1 = iy1 = pad - GLYPH_INSET
+    ix2 = iy2 = icon_sz - pad - GLYPH_INSET
+
+    if idx == 0:
+        # Circle
+        r = 8
+        cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
+        draw.ellipse((cx - r, cy - r, cx + r, cy + r), fill=(*mc[:3], 50))
+    elif idx == 1:
+        # Lines
+        for i in range(3):
+            w = (ix2 - ix1) - i * 5
+            draw.rounded_rectangle((ix1, iy1 + i * 8, ix1 + w, iy1 + i * 8 + 3),
+                                   radius=1, fill=(*mc[:3], 35 + i * 8))
+    elif idx == 2:
+        # Rounded square
+        s = 9
+        cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
+        draw.rounded_rectangle((cx - s, cy - s, cx + s, cy + s),
+                               radius=3, fill=(*mc[:3], 40))
+    elif idx == 3:
+        # Triangle
+        cx = (ix1 + ix2) // 2
+        draw.polygon([(cx, iy1), (ix2, iy2), (ix1, iy2)], fill=(*mc[:3], 30))
+    elif idx == 4:
+        # 3x3 dots
+        for dx in range(3):
+            for dy in range(3):
+                px = ix1 + 2 + dx * 9
+                py = iy1 + 2 + dy * 9
+                draw.ellipse((px, py, px + 4, py + 4), fill=(*mc[:3], 45))
+    elif idx == 5:
+        # Diamond
+        cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
+        s = 9
+        draw.polygon([(cx, cy - s), (cx + s, cy), (cx, cy + s), (cx - s, cy)],
+                    fill=(*mc[:3], 40))
+    elif idx == 6:
+        # Ring
+        cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
+        draw.ellipse((cx - 9, cy - 9, cx + 9, cy + 9),
+                    outline=(*mc[:3], 55), width=2)
+    elif idx == 7:  # Selected
+        # Star burst
+        cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
+        for angle in range(0, 360, 45):
+            rad = math.radians(angle)
+            ex = cx + int(9 * math.cos(rad))
+            ey = cy + int(9 * math.sin(rad))
+            draw.line((cx, cy, ex, ey), fill=(*ACCENT_1[:3], 90), width=2)
+        draw.ellipse((cx - 3, cy - 3, cx + 3, cy + 3), fill=(*ACCENT_1[:3], 120))
+    elif idx == 8:
+        # Plus
+        cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
+        draw.rounded_rectangle((cx - 1, cy - 9, cx + 2, cy + 9), radius=1, fill=(*mc[:3], 50))
+        draw.rounded_rectangle((cx - 9, cy - 1, cx + 9, cy + 2), radius=1, fill=(*mc[:3], 50))
+    elif idx == 9:
+        # 2x2 grid
+        for gx in range(2):
+            for gy in range(2):
+                sx = ix1 + gx * 12
+                sy = iy1 + gy * 12
+                draw.rounded_rectangle((sx, sy, sx + 9, sy + 9), radius=2, fill=(*mc[:3], 35))
+    elif idx == 10:
+        # Hexagon shape
+        cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
+        pts = []
+        for a in range(6):
+            rad = math.radians(a * 60 - 30)
+            pts.append((cx + int(9 * math.cos(rad)), cy + int(9 * math.sin(rad))))
+        draw.polygon(pts, fill=(*mc[:3], 35))
+    elif idx == 11:
+        # Concentric circles
+        cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
+        for r in [10, 6, 3]:
+            alpha = 20 + (10 - r) * 5
+            draw.ellipse((cx - r, cy - r, cx + r, cy + r), outline=(*mc[:3], alpha), width=1)
+    elif idx == 12:
+        # Arrow right
+        cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
+        draw.polygon([(ix1 + 2, cy - 6), (ix2 - 2, cy), (ix1 + 2, cy + 6)],
+                    fill=(*mc[:3], 40))
+    elif idx == 13:
+        # Wave
+        points = []
+        for px in range(ix1, ix2 + 1, 2):
+            py = (iy1 + iy2) // 2 + int(5 * math.sin((px - ix1) * 0.4))
+            points.append((px, py))
+        if len(points) > 1:
+            draw.line(points, fill=(*mc[:3], 50), width=2)
+    elif idx == 14:
+        # Heart-ish
+        cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
+        draw.ellipse((cx - 7, cy - 5, cx - 1, cy + 1), fill=(*mc[:3], 40))
+        draw.ellipse((cx + 1, cy - 5, cx + 7, cy + 1), fill=(*mc[:3], 40))
+        draw.polygon([(cx - 7, cy - 1), (cx, cy + 8), (cx + 7, cy - 1)], fill=(*mc[:3], 35))
+    return tile
+
+
+def glyph_sprite(idx, mc, fill, icon_sz=40):
+    """The pattern of icon idx from SPRITES, rendered on first use."""
+    return SPRITES.get('glyph', (idx, tuple(mc), tuple(fill), icon_sz),
+                       lambda: render_glyph(idx, mc, fill, icon_sz))
+
+
+def icon_layer(idx, x, y, is_sel, icon_sz=40, icon_r=7):
+    """A scene layer for one icon of the bottom-screen grid."""
+    reach = 12 if is_sel else 1  # the selection glow spills 11px out
+    return DrawLayer(
+        f"icon {idx}",
+        (x - reach, y - reach, x + icon_sz + reach, y + icon_sz + reach),
+        ('icon', idx, x, y, is_sel, icon_sz, icon_r),
+        lambda draw: draw_icon(draw, x, y, idx, is_sel, icon_sz, icon_r)
+    )
+
+
+def bottom_scene():
+    """Lay out bottom.png (320x240) as a scene, bottom layer first."""
     W, H = 320, 240
+    scene = Scene((W, H), WHITE)
 
-    img = create_vertical_gradient(W, H, (253, 253, 255, 255), (244, 244, 247, 255))
-    tex = create_dotted_texture(W, H, spacing=12, dot_alpha=3)
-    img = Image.alpha_composite(img, tex)
-    draw = ImageDraw.Draw(img)
+    colors = ((253, 253, 255, 255), (244, 244, 247, 255))
+    scene.add(SpriteLayer("gradient", (0, 0), ('gradient', W, H, colors),
+                          create_vertical_gradient(W, H, *colors), mode='replace'))
+    scene.add(SpriteLayer("texture", (0, 0), ('dots', W, H, 12, 3),
+                          create_dotted_texture(W, H, spacing=12, dot_alpha=3)))
 
     # === Icon grid ===
     cols, rows = 5, 3
@@ -284,187 +570,70 @@ def generate_bottom_screen():
 
     sel_row, sel_col = 1, 2  # Center-ish selection
 
+    icons = []
     for row in range(rows):
         for col in range(cols):
             x = grid_start_x + col * (icon_sz + gap_x)
             y = grid_start_y + row * (icon_sz + gap_y)
             is_sel = (row == sel_row and col == sel_col)
+            icons.append((row * cols + col, x, y, is_sel))
 
-            # Shadow
-            shadow = Image.new('RGBA', (W, H), (0, 0, 0, 0))
-            sd = ImageDraw.Draw(shadow)
-            sd.rounded_rectangle(
-                (x + 1, y + 2, x + icon_sz + 1, y + icon_sz + 2),
-                radius=icon_r, fill=(0, 0, 0, 10 if not is_sel else 15)
-            )
-            shadow = shadow.filter(ImageFilter.GaussianBlur(radius=2))
-            img = Image.alpha_composite(img, shadow)
-            draw = ImageDraw.Draw(img)
-
-            if is_sel:
-                # Selection glow
-                for g in range(8, 0, -1):
-                    alpha = int(22 * (1 - g / 8))
-                    draw.rounded_rectangle(
-                        (x - 3 - g, y - 3 - g, x + icon_sz + 3 + g, y + icon_sz + 3 + g),
-                        radius=icon_r + g, fill=(*ACCENT_1[:3], alpha)
-                    )
-                # Selected border
-                draw.rounded_rectangle(
-                    (x - 2, y - 2, x + icon_sz + 2, y + icon_sz + 2),
-                    radius=icon_r + 1, outline=ACCENT_1, width=2
-                )
-                fill = (*ACCENT_5[:3], 240)
-            else:
-                fill = (255, 255, 255, 230)
-
-            # Icon body
-            draw.rounded_rectangle(
-                (x, y, x + icon_sz, y + icon_sz),
-                radius=icon_r, fill=fill,
-                outline=(*BASE_2[:3], 160 if not is_sel else 0), width=1
-            )
+    # Shadows, all in one layer under the icons
+    shadows = [((x + 1, y + 2, x + icon_sz + 1, y + icon_sz + 2), 10 if not is_sel else 15)
+               for _, x, y, is_sel in icons]
+    origin, image = render_drop_shadows((W, H), shadows, radius=icon_r, blur=2)
+    scene.add(SpriteLayer("shadows", origin, ('shadows', tuple(shadows), icon_r, 2), image))
 
-            # Inner minimal pattern
-            pad = 9
-            ix1, iy1, ix2, iy2 = x + pad, y + pad, x + icon_sz - pad, y + icon_sz - pad
-            idx = row * cols + col
-            mc = ACCENT_1 if is_sel else ACCENT_3  # Main color for patterns
-
-            if idx == 0:
-                # Circle
-                r = 8
-                cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
-                draw.ellipse((cx - r, cy - r, cx + r, cy + r), fill=(*mc[:3], 50))
-            elif idx == 1:
-                # Lines
-                for i in range(3):
-                    w = (ix2 - ix1) - i * 5
-                    draw.rounded_rectangle((ix1, iy1 + i * 8, ix1 + w, iy1 + i * 8 + 3),
-                                           radius=1, fill=(*mc[:3], 35 + i * 8))
-            elif idx == 2:
-                # Rounded square
-                s = 9
-                cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
-                draw.rounded_rectangle((cx - s, cy - s, cx + s, cy + s),
-                                       radius=3, fill=(*mc[:3], 40))
-            elif idx == 3:
-                # Triangle
-                cx = (ix1 + ix2) // 2
-                draw.polygon([(cx, iy1), (ix2, iy2), (ix1, iy2)], fill=(*mc[:3], 30))
-            elif idx == 4:
-                # 3x3 dots
-                for dx in range(3):
-                    for dy in range(3):
-                        px = ix1 + 2 + dx * 9
-                        py = iy1 + 2 + dy * 9
-                        draw.ellipse((px, py, px + 4, py + 4), fill=(*mc[:3], 45))
-            elif idx == 5:
-                # Diamond
-                cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
-                s = 9
-                draw.polygon([(cx, cy - s), (cx + s, cy), (cx, cy + s), (cx - s, cy)],
-                            fill=(*mc[:3], 40))
-            elif idx == 6:
-                # Ring
-                cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
-                draw.ellipse((cx - 9, cy - 9, cx + 9, cy + 9),
-                            outline=(*mc[:3], 55), width=2)
-            elif idx == 7:  # Selected
-                # Star burst
-                cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
-                for angle in range(0, 360, 45):
-                    rad = math.radians(angle)
-                    ex = cx + int(9 * math.cos(rad))
-                    ey = cy + int(9 * math.sin(rad))
-                    draw.line((cx, cy, ex, ey), fill=(*ACCENT_1[:3], 90), width=2)
-                draw.ellipse((cx - 3, cy - 3, cx + 3, cy + 3), fill=(*ACCENT_1[:3], 120))
-            elif idx == 8:
-                # Plus
-                cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
-                draw.rounded_rectangle((cx - 1, cy - 9, cx + 2, cy + 9), radius=1, fill=(*mc[:3], 50))
-                draw.rounded_rectangle((cx - 9, cy - 1, cx + 9, cy + 2), radius=1, fill=(*mc[:3], 50))
-            elif idx == 9:
-                # 2x2 grid
-                for gx in range(2):
-                    for gy in range(2):
-                        sx = ix1 + gx * 12
-                        sy = iy1 + gy * 12
-                        draw.rounded_rectangle((sx, sy, sx + 9, sy + 9), radius=2, fill=(*mc[:3], 35))
-            elif idx == 10:
-                # Hexagon shape
-                cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
-                pts = []
-                for a in range(6):
-                    rad = math.radians(a * 60 - 30)
-                    pts.append((cx + int(9 * math.cos(rad)), cy + int(9 * math.sin(rad))))
-                draw.polygon(pts, fill=(*mc[:3], 35))
-            elif idx == 11:
-                # Concentric circles
-                cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
-                for r in [10, 6, 3]:
-                    alpha = 20 + (10 - r) * 5
-                    draw.ellipse((cx - r, cy - r, cx + r, cy + r), outline=(*mc[:3], alpha), width=1)
-            elif idx == 12:
-                # Arrow right
-                cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
-                draw.polygon([(ix1 + 2, cy - 6), (ix2 - 2, cy), (ix1 + 2, cy + 6)],
-                            fill=(*mc[:3], 40))
-            elif idx == 13:
-                # Wave
-                points = []
-                for px in range(ix1, ix2 + 1, 2):
-                    py = (iy1 + iy2) // 2 + int(5 * math.sin((px - ix1) * 0.4))
-                    points.append((px, py))
-                if len(points) > 1:
-                    draw.line(points, fill=(*mc[:3], 50), width=2)
-            elif idx == 14:
-                # Heart-ish
-                cx, cy = (ix1 + ix2) // 2, (iy1 + iy2) // 2
-                draw.ellipse((cx - 7, cy - 5, cx - 1, cy + 1), fill=(*mc[:3], 40))
-                draw.ellipse((cx + 1, cy - 5, cx + 7, cy + 1), fill=(*mc[:3], 40))
-                draw.polygon([(cx - 7, cy - 1), (cx, cy + 8), (cx + 7, cy - 1)], fill=(*mc[:3], 35))
+    for idx, x, y, is_sel in icons:
+        scene.add(icon_layer(idx, x, y, is_sel, icon_sz, icon_r))
 
     # === Bottom Toolbar ===
     tb_y = H - toolbar_h - 6
     tb_h = toolbar_h
 
-    # Toolbar background with subtle top border
-    draw.rounded_rectangle(
-        (10, tb_y, W - 10, tb_y + tb_h),
-        radius=8, fill=(255, 255, 255, 210),
-        outline=(*BASE_2[:3], 100), width=1
-    )
-
     try:
         font_tb = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 8)
     except:
         font_tb = ImageFont.load_default()
 
-    # Left items
-    draw.text((22, tb_y + 9), "(Y) Edit", fill=(*TEXT_MID[:3], 130), font=font_tb)
-    draw.text((76, tb_y + 9), "(O) Details", fill=(*TEXT_MID[:3], 130), font=font_tb)
-
-    # Center page dots
-    dot_count = 5
-    dot_gap = 10
-    dots_total = dot_count * dot_gap
-    dot_sx = W // 2 - dots_total // 2
-    for i in range(dot_count):
-        dx = dot_sx + i * dot_gap + 2
-        dy = tb_y + 11
-        if i == 1:
-            draw.ellipse((dx, dy, dx + 5, dy + 5), fill=(*ACCENT_1[:3], 200))
-        else:
-            draw.ellipse((dx, dy, dx + 4, dy + 4), fill=(*TEXT_LIGHT[:3], 50))
-
-    # Right items
-    draw.text((W - 120, tb_y + 9), "(A) Select", fill=(*TEXT_MID[:3], 130), font=font_tb)
-    draw.text((W - 62, tb_y + 9), "(+) Menu", fill=(*TEXT_MID[:3], 130), font=font_tb)
-
-    # Finalize
-    final = Image.new('RGB', (W, H), WHITE)
-    final.paste(img, (0, 0), img)
+    def toolbar(draw):
+        # Toolbar background with subtle top border
+        draw.rounded_rectangle(
+            (10, tb_y, W - 10, tb_y + tb_h),
+            radius=8, fill=(255, 255, 255, 210),
+            outline=(*BASE_2[:3], 100), width=1
+        )
+
+        # Left items
+        draw.text((22, tb_y + 9), "(Y) Edit", fill=(*TEXT_MID[:3], 130), font=font_tb)
+        draw.text((76, tb_y + 9), "(O) Details", fill=(*TEXT_MID[:3], 130), font=font_tb)
+
+        # Center page dots
+        dot_count = 5
+        dot_gap = 10
+        dots_total = dot_count * dot_gap
+        dot_sx = W // 2 - dots_total // 2
+        for i in range(dot_count):
+            dx = dot_sx + i * dot_gap + 2
+            dy = tb_y + 11
+            if i == 1:
+                draw.ellipse((dx, dy, dx + 5, dy + 5), fill=(*ACCENT_1[:3], 200))
+            else:
+                draw.ellipse((dx, dy, dx + 4, dy + 4), fill=(*TEXT_LIGHT[:3], 50))
+
+        # Right items
+        draw.text((W - 120, tb_y + 9), "(A) Select", fill=(*TEXT_MID[:3], 130), font=font_tb)
+        draw.text((W - 62, tb_y + 9), "(+) Menu", fill=(*TEXT_MID[:3], 130), font=font_tb)
+
+    scene.add(DrawLayer("toolbar", (10, tb_y, W - 9, tb_y + tb_h + 1),
+                        ('toolbar', W, tb_y, tb_h), toolbar))
+    return scene
+
+
+def generate_bottom_screen():
+    """Generate bottom.png (320x240) - white dashboard bottom screen."""
+    W, H = 320, 240
+    final = bottom_scene().render()
     final.save(os.path.join(OUTPUT_DIR, "bottom.png"), "PNG")
     print(f"  bottom.png ({W}x{H}) saved")
     return final
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+A small layered compositor for the theme screens.
+A scene is an ordered list of layers, bottom to top. Each layer knows the
+box it paints into and a key that identifies its content, so flattening
+is one pass over the layers, and replacing a layer re-renders only the
+rectangles it covered before and covers now.
+"""
+
+from PIL import Image, ImageDraw
+
+# ImageDraw methods whose first argument is a position or box
+_POSITIONED = {
+    'arc', 'chord', 'ellipse', 'line', 'multiline_text', 'pieslice',
+    'point', 'polygon', 'rectangle', 'regular_polygon', 'rounded_rectangle',
+    'text',
+}
+
+
+def intersect(a, b):
+    """The overlap of two (x0, y0, x1, y1) boxes, or None."""
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[2], b[2]), min(a[3], b[3])
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (x0, y0, x1, y1)
+
+
+def union(a, b):
+    """The smallest box holding both boxes."""
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+class OffsetDraw:
+    """ImageDraw.Draw for a canvas whose top-left corner is at origin on
+    the screen, so that layers can always draw in screen coordinates."""
+
+    def __init__(self, canvas, origin):
+        self.canvas = canvas
+        self.draw = ImageDraw.Draw(canvas)
+        self.ox, self.oy = origin
+
+    def _shift(self, xy):
+        if isinstance(xy[0], (tuple, list)):
+            return [(x - self.ox, y - self.oy) for x, y in xy]
+        return tuple(v - (self.oy if i % 2 else self.ox) for i, v in enumerate(xy))
+
+    def paste(self, image, xy, mask=None):
+        """Paste image with its top-left corner at screen position xy."""
+        self.canvas.paste(image, (xy[0] - self.ox, xy[1] - self.oy), mask)
+
+    def __getattr__(self, name):
+        method = getattr(self.draw, name)
+        if name not in _POSITIONED:
+            return method
+        return lambda xy, *args, **kwargs: method(self._shift(xy), *args, **kwargs)
+
+
+class Layer:
+    """One element of a scene.
+
+    box is the (x0, y0, x1, y1) screen box, exclusive at the far edges,
+    outside of which the layer leaves the canvas alone. key identifies the
+    content: two layers with the same name and key paint the same pixels.
+    """
+
+    def __init__(self, name, box, key):
+        self.name = name
+        self.box = tuple(box)
+        self.key = key
+
+    def paint(self, canvas, origin):
+        """Paint onto canvas, an RGBA image whose top-left corner is at
+        origin on the screen."""
+        raise NotImplementedError
+
+
+class SpriteLayer(Layer):
+    """A layer already drawn into its own RGBA image the size of its box.
+
+    mode says how it goes onto the canvas: 'over' alpha-composites it,
+    'mask' pastes it through its own alpha and 'replace' copies it.
+    """
+
+    def __init__(self, name, box, key, image, mode='over'):
+        x0, y0 = box[:2]
+        super().__init__(name, (x0, y0, x0 + image.width, y0 + image.height), key)
+        self.image = image
+        self.mode = mode
+
+    def paint(self, canvas, origin):
+        ox, oy = origin
+        area = intersect(self.box, (ox, oy, ox + canvas.width, oy + canvas.height))
+        if area is None:
+            return
+        x0, y0, x1, y1 = area
+        bx, by = self.box[:2]
+        tile = self.image.crop((x0 - bx, y0 - by, x1 - bx, y1 - by))
+        dest = (x0 - ox, y0 - oy)
+        if self.mode == 'over':
+            canvas.alpha_composite(tile, dest)
+        elif self.mode == 'mask':
+            canvas.paste(tile, dest, tile)
+        else:
+            canvas.paste(tile, dest)
+
+
+class DrawLayer(Layer):
+    """A layer drawn straight onto the canvas: draw(d) is called with an
+    OffsetDraw, so it draws in screen coordinates whatever the canvas."""
+
+    def __init__(self, name, box, key, draw):
+        super().__init__(name, box, key)
+        self.draw = draw
+
+    def paint(self, canvas, origin):
+        self.draw(OffsetDraw(canvas, origin))
+
+
+class Scene:
+    """An ordered stack of layers flattened onto a solid background."""
+
+    def __init__(self, size, background=(255, 255, 255), layers=()):
+        self.size = size
+        self.background = background
+        self.layers = list(layers)
+        self._image = None
+
+    def add(self, layer):
+        """Put layer on top of the stack."""
+        if any(l.name == layer.name for l in self.layers):
+            raise ValueError(f"scene already has a layer named {layer.name!r}")
+        self.layers.append(layer)
+        if self._image is not None:
+            self._refresh([layer.box])
+
+    def layer(self, name):
+        for l in self.layers:
+            if l.name == name:
+                return l
+        raise KeyError(name)
+
+    def replace(self, layer):
+        """Swap in layer for the layer with the same name. Returns the
+        boxes that were re-rendered, none if the key has not changed."""
+        for i, old in enumerate(self.layers):
+            if old.name == layer.name:
+                break
+        else:
+            raise KeyError(layer.name)
+        self.layers[i] = layer
+        if self._image is None or (old.key == layer.key and old.box == layer.box):
+            return []
+        if intersect(old.box, layer.box):
+            boxes = [union(old.box, layer.box)]
+        else:
+            boxes = [old.box, layer.box]
+        return self._refresh(boxes)
+
+    def flatten(self, box=None):
+        """Composite every layer that touches box (default the whole
+        screen) and return that part of the screen as an RGB image."""
+        if box is None:
+            box = (0, 0) + tuple(self.size)
+        origin = box[:2]
+        canvas = Image.new('RGBA', (box[2] - box[0], box[3] - box[1]), (0, 0, 0, 0))
+        for layer in self.layers:
+            if intersect(layer.box, box):
+                layer.paint(canvas, origin)
+        out = Image.new('RGB', canvas.size, self.background)
+        out.paste(canvas, (0, 0), canvas)
+        return out
+
+    def render(self):
+        """The whole screen. Flattened once, then kept up to date by
+        add() and replace()."""
+        if self._image is None:
+            self._image = self.flatten()
+        return self._image.copy()
+
+    def _refresh(self, boxes):
+        screen = (0, 0) + tuple(self.size)
+        done = []
+        for box in boxes:
+            box = intersect(box, screen)
+            if box is None:
+                continue
+            self._image.paste(self.flatten(box), box[:2])
+            done.append(box)
+        return done
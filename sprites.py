@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Cache of rendered theme sprites, such as the iiSU logo and the icon glyphs.
+Each sprite is rendered once per set of parameters (scale, colours,
+selected state) and kept in an in-memory LRU, optionally backed by PNG
+files on disk so that later runs do not render it again either.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+from PIL import Image
+from atomic_file import atomic_write
+
+# Part of every file name on disk: bump it when the drawing code changes
+# so that sprites saved by older code are not used
+VERSION = 1
+
+
+class SpriteCache:
+    """Rendered sprites keyed by a name and a tuple of parameters.
+
+    At most maxsize sprites are kept in memory, the least recently used
+    being dropped first. With a directory, sprites are also saved there
+    as PNGs and loaded from there on a memory miss. Sprites are shared
+    between callers, so they must not be drawn on.
+    """
+
+    def __init__(self, maxsize=64, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self._sprites = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def path(self, name, params):
+        digest = hashlib.sha256(repr((name, params)).encode()).hexdigest()[:32]
+        return os.path.join(self.directory, f"{name}-{digest}-v{VERSION}.png")
+
+    def get(self, name, params, render):
+        """Return the sprite for (name, params), calling render() to draw
+        it if it is not cached."""
+        key = (name, params)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+
+        sprite = self._load(name, params) if self.directory else None
+        if sprite is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            sprite = render()
+            if self.directory:
+                self._save(name, params, sprite)
+
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.maxsize:
+            self._sprites.popitem(last=False)
+        return sprite
+
+    def clear(self):
+        """Forget the sprites in memory; the files on disk are kept."""
+        self._sprites.clear()
+
+    def _load(self, name, params):
+        try:
+            with Image.open(self.path(name, params)) as im:
+                return im.copy()
+        except OSError:
+            return None
+
+    def _save(self, name, params, sprite):
+        with atomic_write(self.path(name, params)) as f:
+            sprite.save(f, "PNG")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+3DS texture swizzling.
+Textures are stored as 8x8 tiles, tiles in row-major order and the pixels
+of each tile in Morton (Z) order. The tables mapping between that layout
+and plain row-major pixels are built once per (width, height, bytes per
+pixel) and shared by every encoder and decoder.
+"""
+
+from array import array
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # the tables are plain arrays instead
+    np = None
+
+TILE = 8
+
+
+def tile_offset(x, y):
+    """Get Morton/Z-order index for pixel (x,y) within an 8x8 tile."""
+    return (
+        (x & 1) |
+        ((y & 1) << 1) |
+        ((x & 2) << 1) |
+        ((y & 2) << 2) |
+        ((x & 4) << 2) |
+        ((y & 4) << 3)
+    )
+
+
+def _check_size(width, height):
+    if width <= 0 or height <= 0 or width % TILE or height % TILE:
+        raise ValueError(f"texture size {width}x{height} is not a multiple "
+                         f"of {TILE}x{TILE} tiles")
+
+
+def _pixel_order(width, height):
+    """Row-major pixel index for each tiled pixel, as a list."""
+    tiles_x = width // TILE
+    order = [0] * (width * height)
+    for y in range(height):
+        row = y * width
+        for x in range(width):
+            tile_idx = (y // TILE) * tiles_x + x // TILE
+            order[tile_idx * 64 + tile_offset(x % TILE, y % TILE)] = row + x
+    return order
+
+
+@lru_cache(maxsize=None)
+def swizzle_table(width, height, bpp):
+    """Byte index table that tiles a row-major texture:
+    tiled[i] = linear[table[i]]. A NumPy array when numpy is available."""
+    _check_size(width, height)
+    if np is not None:
+        y, x = np.mgrid[0:height, 0:width]
+        tile_idx = (y // TILE) * (width // TILE) + x // TILE
+        dst = tile_idx * 64 + tile_offset(x % TILE, y % TILE)
+        order = np.empty(width * height, dtype=np.intp)
+        order[dst.ravel()] = np.arange(width * height)
+        return (order[:, None] * bpp + np.arange(bpp)).ravel()
+    return array('l', (i * bpp + k for i in _pixel_order(width, height)
+                       for k in range(bpp)))
+
+
+@lru_cache(maxsize=None)
+def unswizzle_table(width, height, bpp):
+    """Byte index table that undoes swizzle_table:
+    linear[i] = tiled[table[i]]."""
+    forward = swizzle_table(width, height, bpp)
+    if np is not None:
+        inverse = np.empty_like(forward)
+        inverse[forward] = np.arange(len(forward))
+        return inverse
+    inverse = array('l', bytes(len(forward) * forward.itemsize))
+    for i, j in enumerate(forward):
+        inverse[j] = i
+    return inverse
+
+
+def _permute(data, table):
+    if np is not None:
+        return np.frombuffer(data, dtype=np.uint8)[table].tobytes()
+    return bytes(map(memoryview(data).cast('B').__getitem__, table))
+
+
+def swizzle(data, width, height, bpp):
+    """Reorder a row-major texture of bpp-byte pixels into 3DS tiles."""
+    table = swizzle_table(width, height, bpp)
+    if len(data) != len(table):
+        raise ValueError(f"expected {len(table)} bytes for a {width}x{height} "
+                         f"texture, got {len(data)}")
+    return _permute(data, table)
+
+
+def unswizzle(data, width, height, bpp):
+    """Reorder a tiled 3DS texture of bpp-byte pixels into row-major order."""
+    table = unswizzle_table(width, height, bpp)
+    if len(data) != len(table):
+        raise ValueError(f"expected {len(table)} bytes for a {width}x{height} "
+                         f"texture, got {len(data)}")
+    return _permute(data, table)